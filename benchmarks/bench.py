@@ -0,0 +1,339 @@
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import tarfile
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import statistics
+import subprocess
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+# Reproduzierbare Messungen ohne Netz und ohne Root: ein lokaler HTTP-Server liefert
+# Katalog, Vorschauen und Archive, Systemwerkzeuge werden durch Shims im PATH ersetzt.
+# Ergebnis ist JSON auf stdout (oder --output), damit Releases verglichen werden können.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Zielauflösung für die Messung mit --optimize
+OPTIMIZE_RESOLUTION = "640x360"
+
+SHIMS = {
+    "sudo": '#!/bin/sh\nexec "$@"\n',
+    "update-initramfs": '#!/bin/sh\necho "update-initramfs $*" >> "$PTM_SHIM_LOG"\nsleep "${PTM_SHIM_INITRAMFS_DELAY:-0}"\n',
+    "plymouth": '#!/bin/sh\necho "plymouth $*" >> "$PTM_SHIM_LOG"\n',
+    "plymouthd": '#!/bin/sh\necho "plymouthd $*" >> "$PTM_SHIM_LOG"\n',
+    "pgrep": '#!/bin/sh\nexit 1\n',
+    # Minimaler Ersatz: verwaltet den Symlink selbst, Priorität spielt keine Rolle
+    "update-alternatives": r'''#!/bin/sh
+echo "update-alternatives $*" >> "$PTM_SHIM_LOG"
+state="$PTM_SHIM_STATE/alternatives"
+touch "$state"
+case "$1" in
+  --install)
+    grep -qxF "$4" "$state" || echo "$4" >> "$state"
+    [ -e "$2" ] || ln -sf "$4" "$2" ;;
+  --set)
+    ln -sf "$3" "$PTM_THEMES_DIR/default.plymouth" ;;
+  --remove)
+    grep -vxF "$3" "$state" > "$state.tmp"; mv "$state.tmp" "$state"
+    if [ "$(readlink "$PTM_THEMES_DIR/default.plymouth")" = "$3" ]; then
+      next=$(head -n 1 "$state")
+      if [ -n "$next" ]; then ln -sf "$next" "$PTM_THEMES_DIR/default.plymouth"; else rm -f "$PTM_THEMES_DIR/default.plymouth"; fi
+    fi ;;
+  --list)
+    cat "$state" ;;
+  --query)
+    echo "Value: $(readlink "$PTM_THEMES_DIR/default.plymouth")" ;;
+esac
+# Statusdatei im dpkg-Format, wie sie ptm/scanner.py liest
+{ printf 'auto\n%s\n\n' "$PTM_THEMES_DIR/default.plymouth"
+  while read -r path; do printf '%s\n100\n' "$path"; done < "$state"
+  printf '\n'; } > "$PTM_ALTERNATIVES_FILE"
+''',
+}
+
+def make_gif(width, height, frames):
+    from PIL import Image, ImageDraw
+    images = []
+    for i in range(frames):
+        im = Image.new("RGB", (width, height), (i * 7 % 256, 40, 90))
+        draw = ImageDraw.Draw(im)
+        x = i * width // frames
+        draw.ellipse((x, height // 3, x + width // 8, height // 3 + width // 8), fill=(250, 200, 40))
+        images.append(im)
+    out = io.BytesIO()
+    images[0].save(out, format="GIF", save_all=True, append_images=images[1:], duration=40, loop=0)
+    return out.getvalue()
+
+def make_theme_tarball(name, png_frames, png_size):
+    from PIL import Image
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w:gz") as tar:
+        def add(path, data):
+            info = tarfile.TarInfo(f"{name}/{path}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        add(f"{name}.plymouth", (
+            "[Plymouth Theme]\nName={0}\nDescription=Benchmark\nModuleName=script\n\n"
+            "[script]\nImageDir=/usr/share/plymouth/themes/{0}\nScriptFile=/usr/share/plymouth/themes/{0}/{0}.script\n"
+        ).format(name).encode())
+        add(f"{name}.script", b"// benchmark\n")
+        for i in range(png_frames):
+            frame = Image.new("RGB", png_size, (i * 3 % 256, 10, 10))
+            data = io.BytesIO()
+            frame.save(data, format="PNG")
+            add(f"progress-{i}.png", data.getvalue())
+    return out.getvalue()
+
+def build_fixtures(root, args, base_url):
+    www = os.path.join(root, "www")
+    os.makedirs(os.path.join(www, "previews"))
+    os.makedirs(os.path.join(www, "themes"))
+    gif = make_gif(args.gif_width, args.gif_height, args.gif_frames)
+    tarball = make_theme_tarball("bench_theme", args.png_frames, (args.png_width, args.png_height))
+
+    catalog = []
+    for i in range(args.themes):
+        name = f"bench_{i:04d}"
+        with open(os.path.join(www, "previews", f"{name}.gif"), "wb") as f:
+            f.write(gif)
+        catalog.append({
+            "name": name,
+            "description": f"Synthetisches Theme {i}",
+            "theme_url": f"{base_url}/themes/bench_theme.tar.gz",
+            "preview_url": f"{base_url}/previews/{name}.gif",
+        })
+    with open(os.path.join(www, "themes", "bench_theme.tar.gz"), "wb") as f:
+        f.write(tarball)
+    with open(os.path.join(www, "themes.json"), "w") as f:
+        json.dump(catalog, f)
+    return www, catalog
+
+def start_server(directory):
+    handler = partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def make_environment(root, base_url, args):
+    shim_dir = os.path.join(root, "shims")
+    os.makedirs(shim_dir)
+    for name, script in SHIMS.items():
+        path = os.path.join(shim_dir, name)
+        with open(path, "w") as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+
+    env = dict(os.environ)
+    dirs = {
+        "PTM_CONFIG_DIR": "config",
+        "PTM_PREVIEW_DIR": "previews",
+        "PTM_THEMES_DIR": "themes",
+        "PTM_ARCHIVE_DIR": "archives",
+        "PTM_BOOT_DIR": "boot",
+        "PTM_SHIM_STATE": "state",
+    }
+    for key, sub in dirs.items():
+        env[key] = os.path.join(root, sub)
+        os.makedirs(env[key])
+    for kernel in ("6.1.0-1-amd64", "6.1.0-2-amd64", "6.5.0-1-amd64"):
+        open(os.path.join(env["PTM_BOOT_DIR"], f"initrd.img-{kernel}"), "w").close()
+    env["PTM_CATALOG_URL"] = f"{base_url}/themes.json"
+    env["PTM_ALTERNATIVES_FILE"] = os.path.join(env["PTM_SHIM_STATE"], "default.plymouth")
+    env["PTM_SHIM_LOG"] = os.path.join(root, "shim.log")
+    env["PTM_SHIM_INITRAMFS_DELAY"] = str(args.initramfs_delay)
+    env["PATH"] = shim_dir + os.pathsep + env["PATH"]
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+def run_phase(phase, env, args):
+    # Jede Phase läuft in einem eigenen Prozess, damit Importe und Spitzen-RSS getrennt gemessen werden
+    cmd = [sys.executable, os.path.abspath(__file__), "--phase", phase, "--repeat", str(args.repeat)]
+    out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def _peak_rss_kb():
+    return {
+        "self_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+def _shim_calls(prefix):
+    try:
+        with open(os.environ["PTM_SHIM_LOG"]) as f:
+            return sum(1 for line in f if line.startswith(prefix))
+    except FileNotFoundError:
+        return 0
+
+def phase_catalog(repeat):
+    from ptm import catalog
+    cold, themes = _timed(catalog.refresh_catalog, force=True)
+    warm = [_timed(catalog.refresh_catalog, force=True)[0] for _ in range(repeat)]
+    cached = [_timed(catalog.load_cached_catalog)[0] for _ in range(repeat)]
+    return {
+        "themes": len(themes or []),
+        "cold_fetch_s": cold,
+        "conditional_fetch_s": statistics.median(warm),
+        "cached_load_s": statistics.median(cached),
+    }
+
+def palette_fidelity(root):
+    # Einblenden aus Schwarz, danach Farben, die im ersten Frame fehlen: das skalierte GIF
+    # muss dieselben Farben zeigen (größte Abweichung je Kanal über alle Frames)
+    from PIL import Image, ImageSequence
+    from ptm import resize
+    colors = [(0, 0, 0), (255, 75, 0), (20, 120, 240), (250, 200, 40)]
+    source, scaled = os.path.join(root, "fade.gif"), os.path.join(root, "fade.scaled.gif")
+    frames = [Image.new("RGB", (320, 240), color) for color in colors]
+    frames[0].save(source, save_all=True, append_images=frames[1:], duration=100, loop=0)
+    resize.scale_gif(source, scaled)
+    with Image.open(scaled) as img:
+        decoded = [frame.convert("RGB").getpixel((10, 10)) for frame in ImageSequence.Iterator(img)]
+    return max(abs(a - b) for got, want in zip(decoded, colors) for a, b in zip(got, want))
+
+def phase_previews(repeat):
+    from ptm import catalog, resize
+    themes = catalog.load_cached_catalog()
+    previews = [(theme["name"], theme["preview_url"]) for theme in themes]
+    cold, results = _timed(lambda: list(resize.scale_gifs(previews)))
+    errors = [str(error) for _, _, error in results if error is not None]
+    warm = [_timed(lambda: list(resize.scale_gifs(previews)))[0] for _ in range(repeat)]
+    single, _ = _timed(resize.get_or_create_scaled_gif, "single", themes[0]["preview_url"], None, 10)
+    return {
+        "previews": len(previews),
+        "errors": errors[:5],
+        "cold_s": cold,
+        "cold_previews_per_s": len(previews) / cold if cold else None,
+        "warm_s": statistics.median(warm),
+        "single_cold_s": single,
+        "palette_max_error": palette_fidelity(resize.SCALED_DIR),
+        "peak_rss": _peak_rss_kb(),
+    }
+
+def phase_install(repeat):
+    from ptm import catalog, config, theme_handler
+    theme = catalog.load_cached_catalog()[0]
+    installs, uninstalls, syncs = [], [], []
+    rebuilds_before = _shim_calls("update-initramfs")
+    for _ in range(repeat):
+        t, ok = _timed(theme_handler.install_theme, theme["name"], theme["theme_url"], theme.get("sha256"))
+        installs.append((t, ok))
+        # Erster Abgleich liest die geänderten Verzeichnisse, der zweite nur den Index.
+        # Der Katalogname (bench_0000) unterscheidet sich absichtlich vom Verzeichnis (bench_theme).
+        t, installed = _timed(theme_handler.sync_installed_themes)
+        syncs.append((t, _timed(theme_handler.sync_installed_themes)[0],
+                      theme["name"] in installed and theme["name"] in config.get_installed_themes()))
+        t, ok = _timed(theme_handler.uninstall_theme_full, theme["name"])
+        uninstalls.append((t, ok))
+
+    # Einmal mit Optimierung, um Zeitaufwand und Ersparnis zu sehen
+    transaction = theme_handler.ThemeTransaction().install(
+        theme["name"], theme["theme_url"], theme.get("sha256"), OPTIMIZE_RESOLUTION)
+    t, results = _timed(transaction.commit)
+    optimized = transaction.report.get("themes", {}).get(theme["name"], {})
+    theme_handler.uninstall_theme_full(theme["name"])
+    return {
+        "install_s": statistics.median(t for t, _ in installs),
+        "first_install_s": installs[0][0],
+        "uninstall_s": statistics.median(t for t, _ in uninstalls),
+        "sync_s": statistics.median(t for t, _, _ in syncs),
+        "sync_cached_s": statistics.median(t for _, t, _ in syncs),
+        "sync_detects_install": all(found for _, _, found in syncs),
+        "optimized_install_s": t,
+        "theme_bytes": optimized.get("before"),
+        "optimized_theme_bytes": optimized.get("after"),
+        "all_ok": all(ok for _, ok in installs + uninstalls) and all(ok for _, _, ok in results),
+        "initramfs_rebuilds": _shim_calls("update-initramfs") - rebuilds_before,
+        "peak_rss": _peak_rss_kb(),
+    }
+
+def phase_startup(repeat):
+    cmd = [sys.executable, os.path.join(REPO_DIR, "main.py"), "list", "--json"]
+    times = [_timed(subprocess.run, cmd, check=True, capture_output=True)[0] for _ in range(repeat)]
+    return {"cli_list_s": statistics.median(times), "cli_list_min_s": min(times)}
+
+PHASES = {
+    "catalog": phase_catalog,
+    "startup": phase_startup,
+    "previews": phase_previews,
+    "install": phase_install,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline-Benchmarks für den Plymouth Theme Manager")
+    parser.add_argument("--themes", type=int, default=50, help="Größe des synthetischen Katalogs")
+    parser.add_argument("--gif-frames", type=int, default=60)
+    parser.add_argument("--gif-width", type=int, default=640)
+    parser.add_argument("--gif-height", type=int, default=480)
+    parser.add_argument("--png-frames", type=int, default=120, help="Bilder pro Theme-Archiv")
+    parser.add_argument("--png-width", type=int, default=1920)
+    parser.add_argument("--png-height", type=int, default=1080)
+    parser.add_argument("--initramfs-delay", type=float, default=0.0, help="simulierte Dauer eines initramfs-Neubaus")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", action="append", choices=sorted(PHASES), help="nur diese Phase(n)")
+    parser.add_argument("--output", help="JSON-Datei statt stdout")
+    parser.add_argument("--keep", action="store_true", help="Arbeitsverzeichnis nicht löschen")
+    parser.add_argument("--phase", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.phase:
+        print(json.dumps(PHASES[args.phase](args.repeat)))
+        return 0
+
+    root = tempfile.mkdtemp(prefix="ptm-bench-")
+    server = None
+    try:
+        server = start_server(os.path.join(root, "www"))
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        fixture_start = time.perf_counter()
+        _, catalog = build_fixtures(root, args, base_url)
+        env = make_environment(root, base_url, args)
+
+        results = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "fixture_s": time.perf_counter() - fixture_start,
+                "params": {key: value for key, value in vars(args).items() if key not in ("phase", "output", "keep")},
+            },
+        }
+        # Reihenfolge zählt: der Katalog muss vor den anderen Phasen im Cache liegen
+        for phase in ("catalog", "startup", "previews", "install"):
+            if args.only and phase not in args.only and phase != "catalog":
+                continue
+            results[phase] = run_phase(phase, env, args)
+    finally:
+        if server:
+            server.shutdown()
+        if args.keep:
+            print(f"Arbeitsverzeichnis: {root}", file=sys.stderr)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
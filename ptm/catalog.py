@@ -0,0 +1,100 @@
+import os
+import json
+import time
+from urllib.parse import urlparse, unquote
+from ptm.config import CONFIG_DIR, cache_dir, write_atomic
+from ptm import trace
+
+CATALOG_DIR = cache_dir(CONFIG_DIR)
+LOCAL_THEME_CACHE = os.path.join(CATALOG_DIR, "themes.json")
+CATALOG_META = os.path.join(CATALOG_DIR, "themes.meta.json")
+# Vom Helfer oder einer früheren Root-Sitzung geschrieben, solange der Benutzer-Cache leer ist
+SYSTEM_THEME_CACHE = os.path.join(CONFIG_DIR, "themes.json")
+THEMES_JSON_URL = "https://raw.githubusercontent.com/SoulInfernoDE/plymouth-theme-manager/refs/heads/main/plymouth_theme_manager/themes.json"
+# Für Rechner ohne Internet: PTM_CATALOG_URL=file:///pfad/zum/spiegel/themes.json
+CATALOG_URL = os.environ.get("PTM_CATALOG_URL", THEMES_JSON_URL)
+FETCH_TIMEOUT = 15
+# Innerhalb dieser Zeit wird der Server gar nicht erst gefragt
+CATALOG_TTL = 6 * 60 * 60
+
+def _read_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def load_cached_catalog():
+    path = LOCAL_THEME_CACHE if os.path.exists(LOCAL_THEME_CACHE) else SYSTEM_THEME_CACHE
+    themes = _read_json(path, [])
+    return themes if isinstance(themes, list) else []
+
+def refresh_catalog(force=False):
+    # Liefert die neue Themenliste oder None, wenn sich nichts geändert hat
+    meta = _read_json(CATALOG_META, {})
+    if not force and os.path.exists(LOCAL_THEME_CACHE) and time.time() - meta.get("checked", 0) < CATALOG_TTL:
+        trace.count("catalog.ttl_hit")
+        return None
+
+    url = urlparse(CATALOG_URL)
+    if url.scheme == "file":
+        return _refresh_from_file(unquote(url.path), meta)
+
+    headers = {}
+    if os.path.exists(LOCAL_THEME_CACHE):
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    import requests
+
+    with trace.span("catalog.fetch", url=CATALOG_URL) as span:
+        r = requests.get(CATALOG_URL, headers=headers, timeout=FETCH_TIMEOUT)
+        span["status"] = r.status_code
+        span["bytes"] = len(r.content)
+    if r.status_code == 304:
+        trace.count("catalog.not_modified")
+        meta["checked"] = time.time()
+        _write_meta(meta)
+        return None
+    r.raise_for_status()
+
+    return _store_catalog(r.content, {
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    })
+
+def _refresh_from_file(path, meta):
+    mtime = os.path.getmtime(path)
+    if os.path.exists(LOCAL_THEME_CACHE) and meta.get("mtime") == mtime:
+        meta["checked"] = time.time()
+        _write_meta(meta)
+        return None
+    with open(path, "rb") as f:
+        return _store_catalog(f.read(), {"mtime": mtime})
+
+def _store_catalog(content, meta):
+    # Erst parsen, dann den Cache ersetzen: eine kaputte Antwort überschreibt nie den alten Stand
+    themes = json.loads(content)
+    if not isinstance(themes, list):
+        raise ValueError("themes.json enthält keine Liste")
+
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    write_atomic(LOCAL_THEME_CACHE, content)
+    meta["checked"] = time.time()
+    _write_meta(meta)
+    return themes
+
+def _write_meta(meta):
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    write_atomic(CATALOG_META, json.dumps(meta).encode("utf-8"))
+
+def diff_catalog(old_themes, new_themes):
+    # Vergleich über den Namen: (neu, entfernt, geändert)
+    old = {theme.get("name"): theme for theme in old_themes}
+    new = {theme.get("name"): theme for theme in new_themes}
+    added = [theme for name, theme in new.items() if name not in old]
+    removed = [theme for name, theme in old.items() if name not in new]
+    changed = [theme for name, theme in new.items() if name in old and old[name] != theme]
+    return added, removed, changed
@@ -0,0 +1,151 @@
+import sys
+import json
+import argparse
+from ptm.catalog import load_cached_catalog, refresh_catalog
+from ptm.optimize import parse_resolution, format_report, format_size
+from ptm import helper, theme_handler, trace
+
+def _find_theme(themes, name):
+    for theme in themes:
+        if theme.get("name", "").lower() == name.lower():
+            return theme
+    return None
+
+def _resolution(text):
+    try:
+        parse_resolution(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return text
+
+def _print_results(results, as_json, report=None):
+    optimized = (report or {}).get("themes", {})
+    initramfs = (report or {}).get("initramfs", {})
+    if as_json:
+        rows = []
+        for action, name, ok in results:
+            row = {"action": action, "theme": name, "ok": ok}
+            if action == "install" and name in optimized:
+                row["optimized"] = optimized[name]
+            if action == "rebuild-initramfs" and initramfs:
+                row["initramfs"] = {kernel: {"before": before, "after": after}
+                                    for kernel, (before, after) in sorted(initramfs.items())}
+            rows.append(row)
+        print(json.dumps(rows, indent=2))
+    else:
+        for action, name, ok in results:
+            print(f"{'OK' if ok else 'FEHLER'}\t{action}\t{name}")
+            if action == "install" and name in optimized:
+                print(f"\t{format_report(optimized[name])}")
+        for kernel, (before, after) in sorted(initramfs.items()):
+            print(f"initramfs {kernel}: {format_size(before)} -> {format_size(after)}")
+    return 0 if all(ok for _, _, ok in results) else 1
+
+def cmd_list(args):
+    if args.refresh:
+        try:
+            refresh_catalog(force=True)
+        except Exception as e:
+            print("Fehler beim Aktualisieren der themes.json:", e, file=sys.stderr)
+    themes = load_cached_catalog()
+    installed = theme_handler.installed_by_name(theme.get("name") for theme in themes)
+    default = theme_handler.current_default()
+    rows = []
+    for theme in themes:
+        name = theme.get("name")
+        rows.append({
+            "name": name,
+            "description": theme.get("description", ""),
+            "installed": name in installed,
+            "default": bool(default) and default == installed.get(name),
+        })
+    if args.installed:
+        rows = [row for row in rows if row["installed"]]
+
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+    else:
+        for row in rows:
+            flags = ("*" if row["default"] else " ") + ("i" if row["installed"] else " ")
+            print(f"{flags} {row['name']}\t{row['description']}")
+    return 0
+
+def cmd_install(args):
+    themes = load_cached_catalog()
+    transaction = theme_handler.ThemeTransaction()
+    for name in args.themes:
+        theme = _find_theme(themes, name)
+        if theme is None:
+            print(f"Theme nicht im Katalog: {name}", file=sys.stderr)
+            return 1
+        transaction.install(theme["name"], theme.get("theme_url"), theme.get("sha256"), args.optimize)
+    if args.set_default:
+        transaction.set_default(_find_theme(themes, args.themes[-1])["name"])
+
+    return _print_results(helper.commit(transaction), args.json, transaction.report)
+
+def cmd_uninstall(args):
+    transaction = theme_handler.ThemeTransaction()
+    for name in args.themes:
+        transaction.uninstall(name)
+    return _print_results(helper.commit(transaction), args.json, transaction.report)
+
+def cmd_set_default(args):
+    transaction = theme_handler.ThemeTransaction().set_default(args.theme)
+    return _print_results(helper.commit(transaction), args.json, transaction.report)
+
+def cmd_sync(args):
+    installed = theme_handler.sync_installed_themes(theme.get("name") for theme in load_cached_catalog())
+    try:
+        themes = refresh_catalog(force=True)
+    except Exception as e:
+        print("Fehler beim Aktualisieren der themes.json:", e, file=sys.stderr)
+        return 1
+    result = {"catalog_updated": themes is not None, "installed": sorted(installed)}
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print("Katalog aktualisiert." if result["catalog_updated"] else "Katalog ist aktuell.")
+        print("Installiert:", ", ".join(result["installed"]) or "-")
+    return 0
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", help="Ausgabe als JSON")
+    common.add_argument("--trace", action="store_true", help="Phasen-Zeiten messen")
+    common.add_argument("--trace-file", metavar="DATEI",
+                        help="Phasen-Zeiten messen und zusätzlich als JSON-Zeilen in DATEI speichern")
+    parser = argparse.ArgumentParser(prog="plymouth-theme-manager", description="Plymouth-Themes ohne GUI verwalten")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("list", parents=[common], help="Themes aus dem Katalog anzeigen")
+    p.add_argument("--installed", action="store_true", help="nur installierte Themes")
+    p.add_argument("--refresh", action="store_true", help="Katalog vorher aktualisieren")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("install", parents=[common], help="Themes installieren")
+    p.add_argument("themes", nargs="+")
+    p.add_argument("--set-default", action="store_true", help="letztes Theme als Standard setzen")
+    p.add_argument("--optimize", metavar="BREITExHÖHE", type=_resolution,
+                   help="Bilder auf diese Auflösung verkleinern, verlustfrei komprimieren und Duplikate zusammenlegen")
+    p.set_defaults(func=cmd_install)
+
+    p = sub.add_parser("uninstall", parents=[common], help="Themes entfernen")
+    p.add_argument("themes", nargs="+")
+    p.set_defaults(func=cmd_uninstall)
+
+    p = sub.add_parser("set-default", parents=[common], help="Standard-Theme setzen")
+    p.add_argument("theme")
+    p.set_defaults(func=cmd_set_default)
+
+    p = sub.add_parser("sync", parents=[common], help="Installierte Themes und Katalog abgleichen")
+    p.set_defaults(func=cmd_sync)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    trace.configure(args.trace_file or ("1" if args.trace else None))
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
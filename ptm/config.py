@@ -1,38 +1,203 @@
+import io
 import os
+import fcntl
+import tempfile
+import threading
 import configparser
+from contextlib import contextmanager
 
-CONFIG_DIR = "/usr/share/plymouth/themes_manager"
+CONFIG_DIR = os.environ.get("PTM_CONFIG_DIR", "/usr/share/plymouth/themes_manager")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "ptm.conf")
+# GUI und CLI laufen ohne Root: Katalog, Vorschauen und Theme-Index landen dann im Benutzer-Cache
+USER_CACHE_DIR = os.environ.get("PTM_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "plymouth-theme-manager")
+# theme_dirs: Katalogname -> Verzeichnis unter PLYMOUTH_THEMES_DIR (z. B. Black-HUD -> black_hud)
+SECTIONS = ("installed", "current_theme", "converted_gifs", "theme_dirs")
+# Altes Schema aus config_manager.py -> neues Schema
+LEGACY_SECTIONS = {"installed_themes": "installed"}
+
+def _writable(path):
+    # Für noch nicht vorhandene Verzeichnisse zählt das nächste vorhandene übergeordnete
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return False
+        path = parent
+    return os.access(path, os.W_OK)
+
+def cache_dir(system_dir, name=None):
+    # Das Systemverzeichnis, wenn es beschreibbar ist (root, Helfer), sonst der Benutzer-Cache
+    if _writable(system_dir):
+        return system_dir
+    return os.path.join(USER_CACHE_DIR, name) if name else USER_CACHE_DIR
+
+def write_atomic(path, data, durable=False):
+    # Erst temporäre Datei im Zielverzeichnis schreiben, dann umbenennen;
+    # durable: vor dem Umbenennen auf die Platte bringen (ptm.conf)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        # mkstemp legt 0600 an; was root schreibt, muss der Benutzer lesen können
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class Section(dict):
+    # Schlüssel sind (wie bei ConfigParser) klein geschrieben, Abfragen ignorieren Groß-/Kleinschreibung
+    def __contains__(self, key):
+        return dict.__contains__(self, key.lower())
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, key.lower())
+
+    def get(self, key, default=None):
+        return dict.get(self, key.lower(), default)
+
+def _migrate(config):
+    changed = False
+    for old, new in LEGACY_SECTIONS.items():
+        if config.has_section(old):
+            if not config.has_section(new):
+                config.add_section(new)
+            for key, value in config.items(old):
+                if not config.has_option(new, key):
+                    config.set(new, key, value)
+            config.remove_section(old)
+            changed = True
+    for section in SECTIONS:
+        if not config.has_section(section):
+            config.add_section(section)
+    return changed
+
+class ConfigStore:
+    # Hält ptm.conf im Speicher und liest die Datei nur neu, wenn sich ihre mtime ändert.
+    # Änderungen werden gesammelt und unter Dateisperre atomar geschrieben.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.config = None
+        self.mtime = None
+        self.pending = None
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        mtime = self._mtime()
+        if self.config is not None and mtime == self.mtime:
+            return
+        config = configparser.ConfigParser()
+        config.read(self.path)
+        migrated = _migrate(config)
+        self.config = config
+        self.mtime = mtime
+        if migrated:
+            try:
+                self._write([])
+            except OSError as e:
+                print("Konfiguration konnte nicht gespeichert werden:", e)
+
+    def ensure(self):
+        with self.lock:
+            if self._mtime() is None:
+                self._write([])
+
+    def get(self, section):
+        with self.lock:
+            self._load()
+            return Section(self.config.items(section))
+
+    def snapshot(self):
+        with self.lock:
+            self._load()
+            config = configparser.ConfigParser()
+            config.read_dict(self.config)
+            return config
+
+    @contextmanager
+    def batch(self):
+        # Alle Änderungen innerhalb des Blocks werden mit einem einzigen Schreibvorgang gespeichert
+        with self.lock:
+            outer = self.pending is None
+            if outer:
+                self.pending = []
+            try:
+                yield self
+                if outer and self.pending:
+                    self._write(self.pending)
+            finally:
+                if outer:
+                    self.pending = None
+
+    def set(self, section, key, value):
+        with self.batch():
+            self.pending.append((section, key, value))
+
+    def remove(self, section, key):
+        with self.batch():
+            self.pending.append((section, key, None))
+
+    def replace(self, config):
+        # Ganze Konfiguration ersetzen (für config_manager.save_config)
+        changes = [(section, None, None) for section in SECTIONS]
+        for section in config.sections():
+            changes.extend((section, key, value) for key, value in config.items(section))
+        with self.batch():
+            self.pending.extend(changes)
+
+    def _write(self, changes):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Unter der Sperre frisch lesen, damit Änderungen anderer Prozesse erhalten bleiben
+            config = configparser.ConfigParser()
+            config.read(self.path)
+            _migrate(config)
+            for section, key, value in changes:
+                if not config.has_section(section):
+                    config.add_section(section)
+                if key is None:
+                    for option in config.options(section):
+                        config.remove_option(section, option)
+                elif value is None:
+                    config.remove_option(section, key)
+                else:
+                    config.set(section, key, value)
+
+            content = io.StringIO()
+            config.write(content)
+            write_atomic(self.path, content.getvalue().encode("utf-8"), durable=True)
+            self.config = config
+            self.mtime = self._mtime()
+
+store = ConfigStore(CONFIG_FILE)
 
 def ensure_config_file():
-    if not os.path.exists(CONFIG_DIR):
-        os.makedirs(CONFIG_DIR, exist_ok=True)
-    if not os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "w") as f:
-            f.write("[installed]\n")
+    store.ensure()
 
 def get_installed_themes():
-    ensure_config_file()
-    config = configparser.ConfigParser()
-    config.read(CONFIG_FILE)
-    return config["installed"] if "installed" in config else {}
+    return store.get("installed")
 
 def mark_theme_installed(theme_name, gif_path):
-    ensure_config_file()
-    config = configparser.ConfigParser()
-    config.read(CONFIG_FILE)
-    if "installed" not in config:
-        config["installed"] = {}
-    config["installed"][theme_name] = gif_path
-    with open(CONFIG_FILE, "w") as f:
-        config.write(f)
+    store.set("installed", theme_name, gif_path)
 
 def remove_installed_theme(theme_name):
-    ensure_config_file()
-    config = configparser.ConfigParser()
-    config.read(CONFIG_FILE)
-    if "installed" in config and theme_name in config["installed"]:
-        del config["installed"][theme_name]
-        with open(CONFIG_FILE, "w") as f:
-            config.write(f)
+    with store.batch():
+        store.remove("installed", theme_name)
+        store.remove("theme_dirs", theme_name)
+
+def get_theme_dirs():
+    return store.get("theme_dirs")
 
+def set_theme_dir(theme_name, directory):
+    store.set("theme_dirs", theme_name, directory)
@@ -0,0 +1,390 @@
+import gi
+gi.require_version('Gtk', '3.0')
+import os
+from concurrent.futures import ThreadPoolExecutor
+from ptm.resize import scale_gifs
+from ptm.theme_handler import ThemeTransaction, sync_installed_themes, find_installed
+from ptm.config import get_installed_themes
+from ptm.live_preview import LivePreviewDialog
+from ptm import helper
+from ptm.catalog import load_cached_catalog, refresh_catalog, diff_catalog
+
+from gi.repository import Gtk, GdkPixbuf, GLib
+
+APP_ICON_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'icon.png')
+PREVIEW_WORKERS = 4
+# Vorschauen in diesem Abstand (Pixel) ober- und unterhalb des sichtbaren Bereichs bleiben dekodiert
+VISIBLE_MARGIN = 400
+
+class ThemeManager(Gtk.Window):
+    def __init__(self):
+        super().__init__(title="Plymouth Theme Manager")
+        self.set_default_size(800, 600)
+        self.set_icon_name("application-x-executable")
+
+        vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
+        self.add(vbox)
+
+        menubar = Gtk.MenuBar()
+        vbox.pack_start(menubar, False, False, 0)
+
+        aktionen_menu = Gtk.Menu()
+        aktionen_item = Gtk.MenuItem(label="Aktionen")
+        aktionen_item.set_submenu(aktionen_menu)
+
+        install_item = Gtk.MenuItem(label="Installieren")
+        install_item.connect("activate", self.on_install_view)
+        aktionen_menu.append(install_item)
+
+        uninstall_item = Gtk.MenuItem(label="Deinstallieren")
+        uninstall_item.connect("activate", self.on_uninstall_view)
+        aktionen_menu.append(uninstall_item)
+
+        self.apply_item = Gtk.MenuItem(label="Änderungen anwenden")
+        self.apply_item.set_sensitive(False)
+        self.apply_item.connect("activate", self.on_apply_clicked)
+        aktionen_menu.append(self.apply_item)
+
+        help_menu = Gtk.Menu()
+        help_item = Gtk.MenuItem(label="Hilfe")
+        help_item.set_submenu(help_menu)
+
+        about_item = Gtk.MenuItem(label="Über")
+        about_item.connect("activate", self.on_about)
+        help_menu.append(about_item)
+
+        menubar.append(aktionen_item)
+        menubar.append(help_item)
+
+        self.stack = Gtk.Stack()
+        self.stack.set_transition_type(Gtk.StackTransitionType.SLIDE_LEFT_RIGHT)
+        self.stack.set_transition_duration(300)
+        vbox.pack_start(self.stack, True, True, 0)
+
+        self.install_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
+        self.stack.add_titled(self.install_box, "install", "Installieren")
+
+        self.flowbox = Gtk.FlowBox()
+        self.flowbox.set_max_children_per_line(2)
+        self.flowbox.set_selection_mode(Gtk.SelectionMode.NONE)
+
+        self.flowbox.set_filter_func(self.filter_card)
+        self.flowbox.connect("size-allocate", self.schedule_visible_update)
+
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_placeholder_text("Themes durchsuchen")
+        self.search_entry.connect("search-changed", self.on_search_changed)
+        self.install_box.pack_start(self.search_entry, False, False, 0)
+
+        scroll = Gtk.ScrolledWindow()
+        scroll.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        scroll.add(self.flowbox)
+        self.vadjustment = scroll.get_vadjustment()
+        self.vadjustment.connect("value-changed", self.schedule_visible_update)
+        self.install_box.pack_start(scroll, True, True, 0)
+
+        icon = Gtk.Image.new_from_file(APP_ICON_PATH)
+        icon.set_halign(Gtk.Align.CENTER)
+        self.install_box.pack_end(icon, False, False, 10)
+
+        # Netzwerk und Bildskalierung laufen im Hintergrund, das Fenster erscheint sofort
+        # mit dem zuletzt gespeicherten Katalog
+        self.executor = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS)
+        self.connect("destroy", self.on_destroy)
+        self.cards = {}
+        self.themes = []
+        # Suchindex: Theme-Name -> kleingeschriebener Text aus Name und Beschreibung
+        self.search_index = {}
+        self.search_terms = []
+        self.visible_update_pending = False
+        # Vorgemerkte Aktionen, werden gesammelt mit einem initramfs-Neubau angewendet
+        self.transaction = ThemeTransaction()
+        # Während eine Transaktion läuft, bleibt "Änderungen anwenden" gesperrt
+        self.committing = False
+        self.show_themes(load_cached_catalog(), get_installed_themes())
+        self.executor.submit(self.refresh_themes)
+
+    def on_destroy(self, widget):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def on_install_view(self, widget):
+        self.stack.set_visible_child_name("install")
+
+    def on_uninstall_view(self, widget):
+        installed = get_installed_themes()
+        dialog = Gtk.Dialog(title="Theme deinstallieren", parent=self, flags=0)
+        dialog.set_default_size(400, 300)
+        dialog.add_button("Abbrechen", Gtk.ResponseType.CANCEL)
+        dialog.add_button("Deinstallieren", Gtk.ResponseType.OK)
+
+        box = dialog.get_content_area()
+        combo = Gtk.ComboBoxText()
+        for theme_name in installed:
+            combo.append_text(theme_name)
+        combo.set_active(0)
+        box.add(combo)
+        dialog.show_all()
+
+        response = dialog.run()
+        if response == Gtk.ResponseType.OK:
+            selected = combo.get_active_text()
+            if selected:
+                self.queue_action(self.transaction.uninstall, selected)
+        dialog.destroy()
+
+    def on_about(self, widget):
+        dialog = Gtk.AboutDialog()
+        dialog.set_program_name("Plymouth Theme Manager")
+        dialog.set_version("1.0")
+        dialog.set_website("https://github.com/SoulInfernoDE/plymouth-theme-manager")
+        dialog.set_website_label("Projekt auf GitHub")
+        dialog.set_comments("Open Source Software von SoulInfernoDE Icons: https://icons8.de")
+        dialog.set_logo(Gtk.Image.new_from_file(APP_ICON_PATH).get_pixbuf())
+        dialog.set_transient_for(self)
+        dialog.run()
+        dialog.destroy()
+
+    def refresh_themes(self):
+        # Läuft im Worker-Thread: keine GTK-Aufrufe hier, nur über GLib.idle_add
+        installed_themes = sync_installed_themes(theme.get("name") for theme in self.themes)
+        try:
+            themes = refresh_catalog()
+        except Exception as e:
+            print("Fehler beim Aktualisieren der themes.json:", e)
+            themes = None
+        GLib.idle_add(self.apply_catalog, themes, installed_themes)
+
+    def show_themes(self, themes, installed_themes):
+        self.themes = themes
+        for theme in themes:
+            self.add_theme_card(theme, installed_themes)
+        self.load_previews_async(themes)
+        self.update_height()
+
+    def update_height(self):
+        rows = (len(self.themes) + 1) // 2
+        height = min(200 * rows + 120, 1000)
+        self.resize(800, height)
+
+    def apply_catalog(self, themes, installed_themes):
+        # Nur Änderungen gegenüber dem angezeigten Katalog übernehmen
+        self.update_installed(installed_themes)
+        if themes is None:
+            return False
+
+        added, removed, changed = diff_catalog(self.themes, themes)
+        for theme in removed + changed:
+            card = self.cards.pop(theme.get("name"))
+            self.search_index.pop(theme.get("name"), None)
+            self.flowbox.remove(card["frame"].get_parent())
+        for theme in added + changed:
+            self.add_theme_card(theme, installed_themes, themes.index(theme))
+        self.themes = themes
+        self.load_previews_async(added + changed)
+        self.update_height()
+        return False
+
+    def update_installed(self, installed_themes):
+        for name, card in self.cards.items():
+            card["preview_btn"].set_visible(name in installed_themes)
+            card["default_btn"].set_visible(name in installed_themes)
+
+    def load_previews_async(self, themes):
+        if not themes:
+            return
+        cards = {theme.get("name"): self.cards[theme.get("name")] for theme in themes}
+        previews = [(theme.get("name"), theme.get("preview_url")) for theme in themes]
+        self.executor.submit(self.load_previews, previews, cards)
+
+    def load_previews(self, previews, cards):
+        # Läuft im Worker-Thread: Dateien werden nur erzeugt, dekodiert wird erst bei Sichtbarkeit
+        for name, scaled_path, error in scale_gifs(previews):
+            if error is not None:
+                print("Bild konnte nicht geladen werden:", error)
+            GLib.idle_add(self.on_preview_ready, cards[name], scaled_path)
+
+    def on_preview_ready(self, card, scaled_path):
+        card["path"] = scaled_path
+        if scaled_path is None:
+            card["image"].set_from_icon_name("image-missing", Gtk.IconSize.DIALOG)
+        self.schedule_visible_update()
+        return False
+
+    def schedule_visible_update(self, *args):
+        if not self.visible_update_pending:
+            self.visible_update_pending = True
+            GLib.idle_add(self.update_visible_cards)
+
+    def is_near_viewport(self, card):
+        child = card["frame"].get_parent()
+        if child is None or not child.get_child_visible():
+            return False
+        alloc = child.get_allocation()
+        top = self.vadjustment.get_value() - VISIBLE_MARGIN
+        bottom = self.vadjustment.get_value() + self.vadjustment.get_page_size() + VISIBLE_MARGIN
+        return alloc.y + alloc.height >= top and alloc.y <= bottom
+
+    def update_visible_cards(self):
+        # Nur Karten nahe am sichtbaren Bereich halten eine laufende Animation
+        self.visible_update_pending = False
+        for card in self.cards.values():
+            if not card.get("path"):
+                continue
+            if self.is_near_viewport(card):
+                if card.get("anim") is None and not card.get("decoding"):
+                    card["decoding"] = True
+                    self.executor.submit(self.decode_preview, card)
+            elif card.get("anim") is not None:
+                card["anim"] = None
+                card["image"].set_from_icon_name("image-loading", Gtk.IconSize.DIALOG)
+        return False
+
+    def decode_preview(self, card):
+        try:
+            anim = GdkPixbuf.PixbufAnimation.new_from_file(card["path"])
+        except Exception as e:
+            print("Bild konnte nicht geladen werden:", e)
+            anim = None
+        GLib.idle_add(self.set_preview, card, anim)
+
+    def set_preview(self, card, anim):
+        card["decoding"] = False
+        if anim is None:
+            card["path"] = None
+            card["image"].set_from_icon_name("image-missing", Gtk.IconSize.DIALOG)
+        elif self.is_near_viewport(card):
+            card["anim"] = anim
+            card["image"].set_from_animation(anim)
+        return False
+
+    def filter_card(self, child):
+        if not self.search_terms:
+            return True
+        text = self.search_index.get(child.get_child().theme_name, "")
+        return all(term in text for term in self.search_terms)
+
+    def on_search_changed(self, entry):
+        # Filtert die vorhandenen Karten, ohne Widgets neu aufzubauen
+        self.search_terms = entry.get_text().lower().split()
+        self.flowbox.invalidate_filter()
+        self.schedule_visible_update()
+
+    def add_theme_card(self, theme, installed_themes, position=-1):
+        name = theme.get("name")
+        theme_url = theme.get("theme_url")
+
+        frame = Gtk.Frame()
+        frame.theme_name = name
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        box.set_margin_top(10)
+        box.set_margin_bottom(10)
+        box.set_margin_start(10)
+        box.set_margin_end(10)
+        frame.add(box)
+
+        label = Gtk.Label(label=name)
+        label.set_xalign(0.5)
+        box.pack_start(label, False, False, 0)
+
+        # Platzhalter, bis die Vorschau im Hintergrund fertig ist
+        image = Gtk.Image.new_from_icon_name("image-loading", Gtk.IconSize.DIALOG)
+        image.set_size_request(-1, 192)
+        image.set_halign(Gtk.Align.CENTER)
+        box.pack_start(image, False, False, 0)
+
+        install_btn = Gtk.Button(label="Installieren")
+        install_btn.connect("clicked", self.on_install_clicked, name, theme_url, theme.get("sha256"))
+        box.pack_start(install_btn, False, False, 0)
+
+        default_btn = Gtk.Button(label="Als Standard setzen")
+        default_btn.connect("clicked", self.on_default_clicked, name)
+        box.pack_start(default_btn, False, False, 0)
+
+        preview_btn = Gtk.Button(label="Live Vorschau")
+        preview_btn.connect("clicked", self.on_preview_clicked, name)
+        box.pack_start(preview_btn, False, False, 0)
+
+        frame.show_all()
+        # Sonst macht show_all() des Fensters die Knöpfe wieder sichtbar
+        for btn in (default_btn, preview_btn):
+            btn.set_no_show_all(True)
+            btn.set_visible(name in installed_themes)
+        self.flowbox.insert(frame, position)
+        self.cards[name] = {"frame": frame, "image": image, "install_btn": install_btn,
+                           "preview_btn": preview_btn, "default_btn": default_btn}
+        self.search_index[name] = f"{name} {theme.get('description', '')}".lower()
+
+    def on_install_clicked(self, button, theme_name, theme_url, sha256):
+        print(f"Theme vorgemerkt: {theme_name}")
+        self.queue_action(self.transaction.install, theme_name, theme_url, sha256)
+        button.set_label("Vorgemerkt")
+        button.set_sensitive(False)
+
+    def on_default_clicked(self, button, theme_name):
+        self.queue_action(self.transaction.set_default, theme_name)
+
+    def queue_action(self, action, *args):
+        action(*args)
+        if not self.committing:
+            self.apply_item.set_label(f"Änderungen anwenden ({len(self.transaction)})")
+            self.apply_item.set_sensitive(True)
+
+    def on_apply_clicked(self, widget):
+        if self.committing:
+            return
+        self.committing = True
+        transaction, self.transaction = self.transaction, ThemeTransaction()
+        self.apply_item.set_label("Änderungen werden angewendet …")
+        self.apply_item.set_sensitive(False)
+        self.executor.submit(self.commit_transaction, transaction)
+
+    def commit_transaction(self, transaction):
+        # Läuft im Worker-Thread; die privilegierten Schritte übernimmt der Helfer
+        try:
+            results = helper.commit(transaction, lambda *step: GLib.idle_add(self.on_transaction_progress, *step))
+        except Exception as e:
+            # on_transaction_done muss trotzdem laufen, sonst bleibt "Änderungen anwenden" gesperrt
+            print("Fehler beim Anwenden der Änderungen:", e)
+            results = []
+        for action, theme_name, ok in results:
+            if not ok:
+                print(f"{action} von {theme_name} fehlgeschlagen.")
+            elif action == "uninstall":
+                print(f"{theme_name} erfolgreich deinstalliert.")
+        installed = [theme_name for action, theme_name, ok in results if action == "install"]
+        GLib.idle_add(self.on_transaction_done, installed,
+                      sync_installed_themes(theme.get("name") for theme in self.themes))
+
+    def on_transaction_progress(self, action, theme_name, state):
+        if state == "start":
+            label = "initramfs wird neu erstellt …" if action == "rebuild-initramfs" else f"{theme_name}: {action} …"
+            self.apply_item.set_label(label)
+        return False
+
+    def on_transaction_done(self, installed, installed_themes):
+        self.update_installed(installed_themes)
+        for theme_name in installed:
+            card = self.cards.get(theme_name)
+            if card:
+                card["install_btn"].set_label("Installieren")
+                card["install_btn"].set_sensitive(True)
+        # Während des Durchlaufs vorgemerkte Aktionen bleiben für den nächsten stehen
+        self.committing = False
+        pending = len(self.transaction)
+        self.apply_item.set_label(f"Änderungen anwenden ({pending})" if pending else "Änderungen anwenden")
+        self.apply_item.set_sensitive(pending > 0)
+        return False
+
+    def on_preview_clicked(self, button, theme_name):
+        # Spielt die Bildfolge im Fenster ab; plymouthd und Root-Rechte sind dafür nicht nötig
+        plymouth_file = find_installed(theme_name)
+        if plymouth_file is None:
+            print(f"Theme ist nicht installiert: {theme_name}")
+            return
+        LivePreviewDialog(self, theme_name, plymouth_file, self.executor)
+
+def main():
+    win = ThemeManager()
+    win.connect("destroy", Gtk.main_quit)
+    win.show_all()
+    Gtk.main()
@@ -0,0 +1,441 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import subprocess
+from urllib.parse import urlparse, unquote
+
+# Langlebiger privilegierter Helfer: GUI und CLI laufen ohne Root und schicken Aufträge
+# als JSON-Zeilen über einen Unix-Socket. Der Helfer wird einmal per pkexec gestartet,
+# sammelt kurz hintereinander eintreffende Aufträge in einer ThemeTransaction und
+# meldet den Fortschritt zurück.
+#
+#   Anfrage: {"id": 1, "op": "install", "args": {"theme": "...", "url": "...", "sha256": null}}
+#   Antwort: {"id": 1, "event": "queued" | "progress" | "done" | "error", ...}
+
+SOCKET_PATH = os.environ.get("PTM_HELPER_SOCKET", "/run/plymouth-theme-manager.sock")
+# Wartezeit nach dem ersten Auftrag, damit weitere im selben Durchlauf landen
+COALESCE_DELAY = 0.3
+# Ohne Verbindungen beendet sich der Helfer nach dieser Zeit
+IDLE_TIMEOUT = 300
+START_TIMEOUT = 60
+# Längste Pause zwischen zwei Meldungen des Helfers (Fortschritt zählt), z. B. während update-initramfs
+REPLY_TIMEOUT = 600
+
+OPS = {
+    "install": {"theme": str, "url": str, "sha256": (str, type(None)), "optimize": (str, type(None))},
+    "remove": {"theme": str},
+    "set-default": {"theme": str},
+    "rebuild-initramfs": {},
+    "preview": {"seconds": int},
+}
+
+class HelperError(Exception):
+    pass
+
+def _mirror_url(url):
+    # file:// nur für Archive im eingestellten Spiegel (PTM_MIRROR_DIR), nicht für beliebige Dateien
+    from ptm.theme_handler import MIRROR_DIR
+    if url.scheme != "file" or not MIRROR_DIR:
+        return False
+    mirror = os.path.realpath(MIRROR_DIR)
+    return os.path.commonpath([mirror, os.path.realpath(unquote(url.path))]) == mirror
+
+def validate(request):
+    if not isinstance(request, dict):
+        raise HelperError("Ungültige Anfrage")
+    op = request.get("op")
+    if op not in OPS:
+        raise HelperError(f"Unbekannte Operation: {op}")
+    args = request.get("args") or {}
+    if not isinstance(args, dict):
+        raise HelperError(f"Ungültige Argumente für {op}")
+    for key, value in args.items():
+        # bool ist eine Unterklasse von int, "seconds": true wäre sonst gültig
+        if key not in OPS[op] or isinstance(value, bool) or not isinstance(value, OPS[op][key]):
+            raise HelperError(f"Ungültiges Argument für {op}: {key}")
+    for key in OPS[op]:
+        if key not in args and key not in ("sha256", "optimize", "seconds"):
+            raise HelperError(f"Fehlendes Argument für {op}: {key}")
+    theme = args.get("theme")
+    # Der Name wird als Verzeichnisname unter /usr/share/plymouth/themes verwendet
+    if theme is not None and (not theme or "/" in theme or theme.startswith(".")):
+        raise HelperError(f"Ungültiger Theme-Name: {theme}")
+    if "url" in args:
+        url = urlparse(args["url"])
+        if url.scheme not in ("http", "https") and not _mirror_url(url):
+            raise HelperError("Nur http(s)-URLs und Archive aus PTM_MIRROR_DIR sind erlaubt")
+    if args.get("optimize"):
+        from ptm.optimize import parse_resolution
+        try:
+            parse_resolution(args["optimize"])
+        except ValueError as e:
+            raise HelperError(str(e))
+    if not 0 < args.get("seconds", 5) <= 30:
+        raise HelperError("Vorschaudauer muss zwischen 1 und 30 Sekunden liegen")
+    return op, args
+
+class Job:
+    def __init__(self, conn, request_id, op, args):
+        self.conn = conn
+        self.id = request_id
+        self.op = op
+        self.args = args
+        self.finished = False
+
+    def send(self, event, **fields):
+        if event in ("done", "error"):
+            self.finished = True
+        self.conn.send({"id": self.id, "event": event, **fields})
+
+class Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        data = (json.dumps(message) + "\n").encode("utf-8")
+        with self.lock:
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                pass
+
+class HelperServer:
+    def __init__(self, socket_path, allowed_uid):
+        self.socket_path = socket_path
+        self.allowed_uid = allowed_uid
+        self.jobs = queue.Queue()
+        self.clients = 0
+        self.last_activity = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _peer_uid(self, sock):
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", creds)[1]
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        os.chown(self.socket_path, self.allowed_uid, -1)
+        server.listen()
+        server.settimeout(5)
+        threading.Thread(target=self._worker, daemon=True).start()
+        try:
+            while not self._idle():
+                try:
+                    sock, _ = server.accept()
+                except socket.timeout:
+                    continue
+                if self._peer_uid(sock) not in (0, self.allowed_uid):
+                    sock.close()
+                    continue
+                threading.Thread(target=self._handle, args=(sock,), daemon=True).start()
+        finally:
+            server.close()
+            os.remove(self.socket_path)
+
+    def _idle(self):
+        with self.lock:
+            return (self.clients == 0 and self.jobs.empty()
+                    and time.monotonic() - self.last_activity > IDLE_TIMEOUT)
+
+    def _handle(self, sock):
+        conn = Connection(sock)
+        with self.lock:
+            self.clients += 1
+        try:
+            for line in sock.makefile("r", encoding="utf-8"):
+                request = None
+                try:
+                    request = json.loads(line)
+                    op, args = validate(request)
+                except (ValueError, HelperError) as e:
+                    # Mit der id der Anfrage, damit der Client nur diesen Auftrag als gescheitert zählt
+                    request_id = request.get("id") if isinstance(request, dict) else None
+                    conn.send({"id": request_id, "event": "error", "ok": False, "error": str(e)})
+                    continue
+                job = Job(conn, request.get("id"), op, args)
+                job.send("queued")
+                self.jobs.put(job)
+        finally:
+            with self.lock:
+                self.clients -= 1
+                self.last_activity = time.monotonic()
+            sock.close()
+
+    def _worker(self):
+        while True:
+            jobs = [self.jobs.get()]
+            time.sleep(COALESCE_DELAY)
+            while True:
+                try:
+                    jobs.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._run_jobs(jobs)
+            except Exception as e:
+                # Der Worker muss weiterlaufen; offene Aufträge bekommen eine Antwort
+                print("Fehler bei der Ausführung:", e, file=sys.stderr)
+                for job in jobs:
+                    if not job.finished:
+                        job.send("error", ok=False, action=job.op, error=str(e))
+            finally:
+                with self.lock:
+                    self.last_activity = time.monotonic()
+
+    def _run_jobs(self, jobs):
+        from ptm import theme_handler
+
+        # Alle Theme-Änderungen in eine Transaktion, initramfs höchstens einmal
+        transaction = theme_handler.ThemeTransaction()
+        owners = []
+        for job in jobs:
+            if job.op == "install":
+                transaction.install(job.args["theme"], job.args["url"], job.args.get("sha256"), job.args.get("optimize"))
+            elif job.op == "remove":
+                transaction.uninstall(job.args["theme"])
+            elif job.op == "set-default":
+                transaction.set_default(job.args["theme"])
+            else:
+                continue
+            owners.append(job)
+
+        rebuilt = False
+        def progress(action, theme_name, state):
+            nonlocal rebuilt
+            if action == "rebuild-initramfs" and state == "done":
+                rebuilt = True
+            # Einmal je Verbindung, nicht je Auftrag
+            for job in {id(job.conn): job for job in jobs}.values():
+                job.send("progress", step=action, theme=theme_name, state=state)
+
+        if owners:
+            results = _commit_local(transaction, progress)
+            # Nach den Aufträgen folgt ggf. das Ergebnis des initramfs-Neubaus
+            rebuild = [ok for action, _, ok in results[len(owners):] if action == "rebuild-initramfs"]
+            for job, (action, theme_name, ok) in zip(owners, results):
+                report = {"initramfs": transaction.report.get("initramfs"), "rebuild": rebuild[0] if rebuild else None}
+                if action == "install":
+                    report["theme"] = transaction.report.get("themes", {}).get(theme_name)
+                job.send("done" if ok else "error", ok=ok, action=action, theme=theme_name, report=report)
+
+        # Mehrere Neubau-Aufträge ergeben einen Neubau, keinen, wenn die Transaktion schon neu gebaut hat
+        rebuild_jobs = [job for job in jobs if job.op == "rebuild-initramfs"]
+        if rebuild_jobs:
+            try:
+                if not rebuilt:
+                    progress("rebuild-initramfs", "", "start")
+                    theme_handler.rebuild_initramfs()
+                    progress("rebuild-initramfs", "", "done")
+                for job in rebuild_jobs:
+                    job.send("done", ok=True, action="rebuild-initramfs")
+            except Exception as e:
+                for job in rebuild_jobs:
+                    job.send("error", ok=False, action="rebuild-initramfs", error=str(e))
+
+        for job in jobs:
+            if job.op != "preview":
+                continue
+            try:
+                theme_handler.show_splash(job.args.get("seconds", 5))
+                job.send("done", ok=True, action="preview")
+            except Exception as e:
+                job.send("error", ok=False, action="preview", error=str(e))
+
+class HelperClient:
+    def __init__(self, socket_path=SOCKET_PATH):
+        self.socket_path = socket_path
+        self.sock = None
+        self.reader = None
+        self.next_id = 1
+        # Eine Verbindung für GUI-Threads: Aufträge und ihre Antworten dürfen sich nicht mischen
+        self.lock = threading.Lock()
+
+    def connect(self, start=True):
+        if self.sock is not None:
+            return self
+        try:
+            self._connect()
+        except OSError:
+            if not start:
+                raise
+            self._start_helper()
+        return self
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(REPLY_TIMEOUT)
+        self.sock = sock
+        self.reader = sock.makefile("r", encoding="utf-8")
+
+    def _start_helper(self):
+        # Einmalige Authentifizierung über polkit; der Helfer bleibt danach bis IDLE_TIMEOUT aktiv
+        # pkexec setzt eine eigene Umgebung, Spiegel- und Archivverzeichnis werden durchgereicht
+        repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = [f"PYTHONPATH={repo_dir}", f"PTM_HELPER_SOCKET={self.socket_path}"]
+        env += [f"{name}={os.path.abspath(os.environ[name])}" for name in ("PTM_MIRROR_DIR", "PTM_ARCHIVE_DIR")
+                if os.environ.get(name)]
+        try:
+            process = subprocess.Popen(
+                ["pkexec", "env", *env, sys.executable, "-m", "ptm.helper", "--uid", str(os.getuid())],
+                start_new_session=True,
+            )
+        except OSError as e:
+            raise HelperError(f"pkexec konnte nicht gestartet werden: {e}")
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                self._connect()
+                return
+            except OSError:
+                pass
+            # Der Helfer läuft bis IDLE_TIMEOUT; endet pkexec vorher, wurde abgebrochen oder verweigert
+            if process.poll() is not None:
+                raise HelperError(f"Privilegierter Helfer nicht gestartet (pkexec beendet mit Code {process.returncode})")
+            time.sleep(0.2)
+        raise HelperError("Privilegierter Helfer konnte nicht gestartet werden")
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+            self.sock = None
+
+    def submit(self, requests, on_event=None):
+        with self.lock:
+            return self._submit(requests, on_event)
+
+    def _submit(self, requests, on_event=None):
+        # Schickt alle Aufträge auf einmal (damit der Helfer sie zusammenfasst)
+        # und wartet auf deren Abschluss; liefert die abschließenden Ereignisse
+        self.connect()
+        pending = {}
+        for op, args in requests:
+            request_id = self.next_id
+            self.next_id += 1
+            pending[request_id] = op
+            self.sock.sendall((json.dumps({"id": request_id, "op": op, "args": args}) + "\n").encode("utf-8"))
+
+        finished = {}
+        while len(finished) < len(pending):
+            try:
+                line = self.reader.readline()
+            except socket.timeout:
+                # Nach einem Timeout ist der Lesepuffer unbrauchbar, beim nächsten Mal neu verbinden
+                self.close()
+                raise HelperError("Keine Antwort vom Helfer")
+            if not line:
+                self.close()
+                raise HelperError("Verbindung zum Helfer verloren")
+            message = json.loads(line)
+            if message.get("id") is None and message.get("event") == "error":
+                raise HelperError(message.get("error"))
+            if on_event:
+                on_event(message)
+            if message.get("id") in pending and message.get("event") in ("done", "error"):
+                finished[message["id"]] = message
+        return [finished[request_id] for request_id in sorted(pending)]
+
+    def request(self, op, on_event=None, **args):
+        return self.submit([(op, args)], on_event)[0]
+
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = HelperClient()
+    return _client
+
+def _uses_helper():
+    return os.geteuid() != 0
+
+def _commit_local(transaction, progress=None):
+    from ptm.config import mark_theme_installed
+    from ptm.preview_cache import find_cached_preview
+
+    results = transaction.commit(progress)
+    for action, theme_name, ok in results:
+        if ok and action == "install":
+            mark_theme_installed(theme_name, find_cached_preview(theme_name) or "")
+    return results
+
+def commit(transaction, progress=None):
+    # Wie ThemeTransaction.commit(), trägt Installationen zusätzlich in die Konfiguration ein;
+    # ohne Root über den Helfer
+    if not _uses_helper():
+        return _commit_local(transaction, progress)
+
+    ops = {"install": "install", "uninstall": "remove", "set_default": "set-default"}
+    steps = {"remove": "uninstall", "set-default": "set_default"}
+    actions, transaction.actions = transaction.actions, []
+    requests = []
+    for action, theme_name, args in actions:
+        request = {"theme": theme_name}
+        if action == "install":
+            request["url"], request["sha256"], request["optimize"] = args
+        requests.append((ops[action], request))
+
+    def on_event(message):
+        if progress and message.get("event") == "progress":
+            progress(steps.get(message["step"], message["step"]), message.get("theme", ""), message["state"])
+
+    try:
+        finished = get_client().submit(requests, on_event)
+    except (OSError, ValueError, HelperError) as e:
+        print("Fehler bei der Kommunikation mit dem Helfer:", e)
+        return [(action, theme_name, False) for action, theme_name, _ in actions]
+    # Berichte wie bei ThemeTransaction.commit() an der Transaktion ablegen
+    transaction.report = {}
+    for (action, theme_name, _), message in zip(actions, finished):
+        if message.get("error"):
+            print(f"Helfer: {theme_name}: {message['error']}")
+        report = message.get("report") or {}
+        if report.get("initramfs"):
+            transaction.report["initramfs"] = report["initramfs"]
+        if report.get("theme"):
+            transaction.report.setdefault("themes", {})[theme_name] = report["theme"]
+    results = [(action, theme_name, message.get("ok", False))
+               for (action, theme_name, _), message in zip(actions, finished)]
+    rebuild = [message["report"]["rebuild"] for message in finished
+               if (message.get("report") or {}).get("rebuild") is not None]
+    if rebuild:
+        results.append(("rebuild-initramfs", "", rebuild[0]))
+    return results
+
+def preview(seconds=5):
+    from ptm import theme_handler
+    if not _uses_helper():
+        theme_handler.show_splash(seconds)
+        return True
+    return get_client().request("preview", seconds=seconds).get("ok", False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Privilegierter Helfer des Plymouth Theme Managers")
+    parser.add_argument("--uid", type=int, default=int(os.environ.get("PKEXEC_UID", 0)),
+                        help="Benutzer, der sich verbinden darf")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    args = parser.parse_args(argv)
+    if os.geteuid() != 0:
+        print("Der Helfer muss als root laufen.", file=sys.stderr)
+        return 1
+    HelperServer(args.socket, args.uid).serve()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import gi
+gi.require_version('Gtk', '3.0')
+import os
+import re
+import threading
+from collections import OrderedDict
+from ptm.scanner import parse_plymouth_file
+from ptm import trace
+
+from gi.repository import Gtk, GdkPixbuf, GLib
+
+# Spielt die Bildfolge eines installierten Themes direkt im Fenster ab, ohne plymouthd und ohne Root.
+# Dekodiert wird im Worker, fertige Bilder landen nur in einem begrenzten LRU-Cache.
+
+PREVIEW_HEIGHT = 360
+FRAME_CACHE_BYTES = int(os.environ.get("PTM_FRAME_CACHE_BYTES", 128 * 1024 * 1024))
+# plymouth ruft die Refresh-Funktion von Skript-Themes 50-mal pro Sekunde auf
+SCRIPT_REFRESH_RATE = 50
+# Bildrate von ply-animation/ply-throbber im two-step-Modul
+TWO_STEP_FPS = 30
+DEFAULT_FPS = 25
+# So viele Bilder werden vor der Wiedergabe vorab dekodiert; mehr als diese und das
+# aktuelle Bild hält das Widget nie, alles andere liegt nur im begrenzten frame_cache
+LOOKAHEAD = 8
+
+_NUMBERED = re.compile(r"^(.*?)-?(\d+)\.png$")
+
+class FrameCache:
+    # (Pfad, Höhe) -> Pixbuf; verdrängt die am längsten nicht benutzten Bilder
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.frames
+
+    def get(self, key):
+        with self.lock:
+            pixbuf = self.frames.get(key)
+            if pixbuf is not None:
+                self.frames.move_to_end(key)
+            return pixbuf
+
+    def put(self, key, pixbuf):
+        with self.lock:
+            if key in self.frames:
+                return
+            self.frames[key] = pixbuf
+            self.size += pixbuf.get_byte_length()
+            while self.size > self.max_bytes and len(self.frames) > 1:
+                _, old = self.frames.popitem(last=False)
+                self.size -= old.get_byte_length()
+
+frame_cache = FrameCache(FRAME_CACHE_BYTES)
+
+def _numbered_frames(directory, prefix):
+    frames = []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    for name in names:
+        match = _NUMBERED.match(name)
+        if match and match.group(1) == prefix:
+            frames.append((int(match.group(2)), os.path.join(directory, name)))
+    return [path for _, path in sorted(frames)]
+
+def _script_fps(script_file):
+    # Skripte wie die von adi1090x schalten alle n Aufrufe ein Bild weiter: Math.Int(progress / n)
+    try:
+        with open(script_file, encoding="utf-8", errors="replace") as f:
+            match = re.search(r"Math\.Int\s*\(\s*\w+\s*/\s*(\d+)\s*\)", f.read())
+    except OSError:
+        return DEFAULT_FPS
+    if match and int(match.group(1)) > 0:
+        return SCRIPT_REFRESH_RATE / int(match.group(1))
+    return SCRIPT_REFRESH_RATE
+
+def find_frames(plymouth_file):
+    # Liefert (Bildpfade, fps) oder ([], None), wenn das Theme keine Bildfolge hat
+    info = parse_plymouth_file(plymouth_file)
+    if info is None:
+        return [], None
+    image_dir = info["image_dir"] or os.path.dirname(plymouth_file)
+    if info["module"] == "two-step":
+        # Der Throbber läuft während des ganzen Bootvorgangs, die Animation nur am Ende
+        for prefix in ("throbber", "animation"):
+            frames = _numbered_frames(image_dir, prefix)
+            if frames:
+                return frames, TWO_STEP_FPS
+    if info["module"] == "script":
+        frames = _numbered_frames(image_dir, "progress")
+        if frames:
+            return frames, _script_fps(info["script_file"])
+
+    # Sonst die längste nummerierte Bildfolge im Verzeichnis
+    prefixes = {}
+    try:
+        for name in os.listdir(image_dir):
+            match = _NUMBERED.match(name)
+            if match:
+                prefixes[match.group(1)] = prefixes.get(match.group(1), 0) + 1
+    except OSError:
+        return [], None
+    if not prefixes:
+        return [], None
+    return _numbered_frames(image_dir, max(prefixes, key=prefixes.get)), DEFAULT_FPS
+
+def load_frame(path, height=PREVIEW_HEIGHT):
+    key = (path, height)
+    pixbuf = frame_cache.get(key)
+    if pixbuf is not None:
+        trace.count("live_preview.cache_hit")
+        return pixbuf
+    source = GdkPixbuf.Pixbuf.new_from_file(path)
+    scale = min(1.0, height / source.get_height())
+    width = max(1, round(source.get_width() * scale))
+    # Auf Schwarz wie beim Booten, Transparenz wird dabei aufgelöst
+    pixbuf = source.composite_color_simple(width, max(1, round(source.get_height() * scale)),
+                                           GdkPixbuf.InterpType.BILINEAR, 255, 32, 0, 0)
+    frame_cache.put(key, pixbuf)
+    return pixbuf
+
+class LivePreview(Gtk.Image):
+    # Spielt die Bilder aus dem frame_cache ab und lässt die nächsten LOOKAHEAD Bilder
+    # im Worker dekodieren; fehlende Bilder werden übersprungen, das Abspieltempo bleibt gleich
+    def __init__(self, plymouth_file, executor, height=PREVIEW_HEIGHT):
+        super().__init__()
+        self.height = height
+        self.executor = executor
+        self.paths, self.fps = find_frames(plymouth_file)
+        self.position = 0
+        self.timer = None
+        # Nur im GTK-Hauptthread benutzt
+        self.pending = set()
+        self.failed = set()
+        self.cancelled = threading.Event()
+        self.set_size_request(-1, height)
+        if not self.paths:
+            self.set_from_icon_name("image-missing", Gtk.IconSize.DIALOG)
+            return
+        self.set_from_icon_name("image-loading", Gtk.IconSize.DIALOG)
+        self.connect("map", self.on_map)
+        self.connect("unmap", self.on_unmap)
+        self.connect("destroy", self.on_destroy)
+        self.prefetch(0)
+
+    def prefetch(self, start):
+        for index in (i % len(self.paths) for i in range(start, start + LOOKAHEAD + 1)):
+            if (index in self.pending or index in self.failed
+                    or (self.paths[index], self.height) in frame_cache):
+                continue
+            self.pending.add(index)
+            self.executor.submit(self.decode_frame, index)
+
+    def decode_frame(self, index):
+        # Läuft im Worker-Thread
+        if self.cancelled.is_set():
+            return
+        pixbuf = None
+        with trace.span("live_preview.decode"):
+            try:
+                pixbuf = load_frame(self.paths[index], self.height)
+            except GLib.Error as e:
+                print("Bild konnte nicht geladen werden:", e)
+        GLib.idle_add(self.on_frame_ready, index, pixbuf)
+
+    def on_frame_ready(self, index, pixbuf):
+        if self.cancelled.is_set():
+            return False
+        self.pending.discard(index)
+        if pixbuf is None:
+            self.failed.add(index)
+        elif index == self.position:
+            self.set_from_pixbuf(pixbuf)
+        return False
+
+    def on_map(self, widget):
+        if self.timer is None:
+            self.timer = GLib.timeout_add(max(1, round(1000 / self.fps)), self.next_frame)
+
+    def on_unmap(self, widget):
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self.timer = None
+
+    def on_destroy(self, widget):
+        self.cancelled.set()
+        self.on_unmap(widget)
+
+    def next_frame(self):
+        self.position = (self.position + 1) % len(self.paths)
+        pixbuf = frame_cache.get((self.paths[self.position], self.height))
+        if pixbuf is not None:
+            self.set_from_pixbuf(pixbuf)
+        self.prefetch(self.position + 1)
+        return True
+
+class LivePreviewDialog(Gtk.Dialog):
+    def __init__(self, parent, theme_name, plymouth_file, executor):
+        super().__init__(title=f"Vorschau: {theme_name}", parent=parent, flags=0)
+        self.add_button("Schließen", Gtk.ResponseType.CLOSE)
+        self.connect("response", lambda dialog, response: dialog.destroy())
+        preview = LivePreview(plymouth_file, executor)
+        if not preview.paths:
+            self.get_content_area().add(Gtk.Label(label="Dieses Theme hat keine Bildfolge für die Vorschau."))
+        self.get_content_area().add(preview)
+        self.show_all()
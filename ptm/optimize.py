@@ -0,0 +1,132 @@
+import os
+import filecmp
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from ptm import trace
+
+# Optionale Verkleinerung der Theme-Dateien vor der Installation: PNGs werden auf die
+# maximale Bildschirmauflösung verkleinert, verlustfrei neu komprimiert und gleiche
+# Bilder per Hardlink zusammengelegt. Alles, was im Theme-Verzeichnis liegt, landet im initramfs.
+
+def parse_resolution(text):
+    # "1920x1080" -> (1920, 1080)
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Ungültige Auflösung: {text} (erwartet BREITExHÖHE)")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Ungültige Auflösung: {text}")
+    return width, height
+
+def _optimize_png(path, max_size):
+    # Läuft im Worker-Prozess; liefert (pfad, verkleinert), verkleinert ist None, wenn das
+    # Bild nicht gelesen oder geschrieben werden konnte; die Datei bleibt dann unverändert
+    try:
+        return path, _recompress_png(path, max_size)
+    except Exception as e:
+        print(f"Bild nicht optimiert: {path}: {e}")
+        return path, None
+
+def _recompress_png(path, max_size):
+    from PIL import Image
+
+    with trace.span("optimize.png") as span, Image.open(path) as image:
+        image.load()
+        info = {key: image.info[key] for key in ("transparency", "gamma") if key in image.info}
+        resized = False
+        if max_size and (image.width > max_size[0] or image.height > max_size[1]):
+            if image.mode == "P":
+                image = image.convert("RGBA")
+                info.pop("transparency", None)
+            image.thumbnail(max_size, Image.LANCZOS)
+            resized = True
+        # Ein vollständig deckender Alphakanal trägt keine Information
+        if image.mode == "RGBA" and image.getchannel("A").getextrema() == (255, 255):
+            image = image.convert("RGB")
+
+        fd, tmp_path = tempfile.mkstemp(prefix=".ptm-opt-", suffix=".png", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, "PNG", optimize=True, **info)
+            before = os.path.getsize(path)
+            after = os.path.getsize(tmp_path)
+            span["bytes"] = before - after
+            # Verlustfreie Neukompression nur übernehmen, wenn sie etwas bringt
+            if resized or after < before:
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return resized
+
+def _hardlink_duplicates(paths):
+    # Gleicher Inhalt -> ein Inode; liefert die Zahl der ersetzten Dateien
+    by_size = {}
+    for path in paths:
+        by_size.setdefault(os.path.getsize(path), []).append(path)
+    linked = 0
+    for group in by_size.values():
+        originals = []
+        for path in sorted(group):
+            for original in originals:
+                if os.path.samefile(original, path):
+                    break
+                if filecmp.cmp(original, path, shallow=False):
+                    tmp_path = path + ".ptm-link"
+                    os.link(original, tmp_path)
+                    os.replace(tmp_path, path)
+                    linked += 1
+                    break
+            else:
+                originals.append(path)
+    return linked
+
+def directory_size(directory):
+    # Hardlinks zählen nur einmal
+    inodes = {}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            st = os.lstat(os.path.join(root, name))
+            inodes[(st.st_dev, st.st_ino)] = st.st_size
+    return sum(inodes.values())
+
+def optimize_theme(directory, max_size=None, processes=None):
+    # max_size: (breite, höhe) oder None (nur neu komprimieren); liefert einen Bericht als dict
+    pngs = [os.path.join(root, name) for root, _, files in os.walk(directory)
+            for name in files if name.lower().endswith(".png")]
+    before = directory_size(directory)
+    resized = failed = 0
+    with trace.span("optimize.theme", files=len(pngs)) as span:
+        if pngs:
+            # "spawn", weil der Aufrufer (GUI, Helfer) bereits Threads laufen hat
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+                chunksize = max(1, len(pngs) // (4 * (processes or os.cpu_count() or 1)))
+                for _, was_resized in pool.map(_optimize_png, pngs, [max_size] * len(pngs), chunksize=chunksize):
+                    if was_resized is None:
+                        failed += 1
+                    else:
+                        resized += was_resized
+        linked = _hardlink_duplicates(pngs)
+        after = directory_size(directory)
+        span["bytes"] = before - after
+    return {"files": len(pngs), "resized": resized, "failed": failed, "hardlinked": linked,
+            "before": before, "after": after}
+
+def format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+def format_report(report):
+    saved = report["before"] - report["after"]
+    percent = 100 * saved / report["before"] if report["before"] else 0
+    text = (f"{format_size(report['before'])} -> {format_size(report['after'])} ({percent:.0f} % kleiner), "
+            f"{report['resized']} von {report['files']} Bildern verkleinert, {report['hardlinked']} per Hardlink zusammengelegt")
+    if report.get("failed"):
+        text += f", {report['failed']} nicht lesbar und unverändert"
+    return text
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from ptm.config import cache_dir, write_atomic
+
+SCALED_DIR = os.environ.get("PTM_PREVIEW_DIR") or cache_dir("/usr/share/icons/animated/themes", "previews")
+CACHE_MAX_BYTES = int(os.environ.get("PTM_PREVIEW_CACHE_BYTES", 64 * 1024 * 1024))
+INDEX_NAME = "index.json"
+
+_cache = None
+
+def cache_key(url, params):
+    # Schlüssel aus URL und Skalierungsparametern: ändert sich eins davon, entsteht ein neuer Eintrag
+    raw = json.dumps([url, params], sort_keys=True).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+class PreviewCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.lock = threading.Lock()
+        self.entries = None
+        self.dirty = False
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.gif")
+
+    def lookup(self, key):
+        with self.lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(self.path(key)):
+                del self.entries[key]
+                self.dirty = True
+                return None
+            return dict(entry)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, key):
+        with self.lock:
+            self._load()
+            if key in self.entries:
+                self.entries[key]["used"] = time.time()
+                self.dirty = True
+
+    def store(self, key, name, url, etag=None, last_modified=None):
+        with self.lock:
+            self._load()
+            self.entries[key] = {
+                "name": name,
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "size": os.path.getsize(self.path(key)),
+                "used": time.time(),
+            }
+            self.dirty = True
+            self._evict(keep=key)
+        return self.path(key)
+
+    def find_by_name(self, name):
+        with self.lock:
+            self._load()
+            matches = [(entry["used"], key) for key, entry in self.entries.items() if entry.get("name") == name]
+        for _, key in sorted(matches, reverse=True):
+            if os.path.exists(self.path(key)):
+                return self.path(key)
+        return None
+
+    def _evict(self, keep=None):
+        # Am längsten nicht benutzte Einträge entfernen, bis das Byte-Budget eingehalten wird
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del self.entries[key]
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(self.index_path, json.dumps(self.entries, indent=1).encode("utf-8"))
+            self.dirty = False
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = PreviewCache(SCALED_DIR, CACHE_MAX_BYTES)
+    return _cache
+
+def find_cached_preview(theme_name):
+    return get_cache().find_by_name(theme_name)
@@ -1,36 +1,262 @@
 import os
-from PIL import Image
-from io import BytesIO
+import math
+import struct
+import shutil
+import tempfile
+from email.utils import formatdate
+from urllib.parse import urlparse, unquote
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from PIL import Image, ImageChops, ImageSequence
 import requests
+from requests.adapters import HTTPAdapter
+from ptm import trace
+from ptm.preview_cache import SCALED_DIR, cache_key, get_cache, find_cached_preview
 
-SCALED_DIR = "/usr/share/icons/animated/themes"
+PREVIEW_HEIGHT = 192
+MAX_DOWNLOADS = 4
+DOWNLOAD_TIMEOUT = 30
+# Palettenindex, der für transparente Pixel reserviert bleibt
+TRANSPARENT_INDEX = 255
+# Größte Abweichung je Farbkanal, bis zu der die globale Palette für einen Frame genügt
+PALETTE_TOLERANCE = 48
 
-def get_or_create_scaled_gif(theme_name, preview_url):
-    os.makedirs(SCALED_DIR, exist_ok=True)
-    gif_path = os.path.join(SCALED_DIR, f"{theme_name}_preview.gif")
+_session = None
 
-    if os.path.exists(gif_path):
-        return gif_path
+def get_session():
+    # Eine gemeinsame Session hält die Verbindungen zu raw.githubusercontent.com offen
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MAX_DOWNLOADS, pool_maxsize=MAX_DOWNLOADS)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+def preview_key(preview_url, max_fps=None, max_frames=None):
+    return cache_key(preview_url, [PREVIEW_HEIGHT, max_fps, max_frames])
+
+def download_preview(preview_url, headers=None):
+    # Wird in eine temporäre Datei gestreamt, damit große GIFs nicht komplett im Speicher landen.
+    # Liefert (None, ...) wenn der Server mit 304 antwortet.
+    url = urlparse(preview_url)
+    if url.scheme == "file":
+        return _copy_local_preview(unquote(url.path), headers)
+    with trace.span("preview.download", url=preview_url) as span, \
+            get_session().get(preview_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        span["status"] = response.status_code
+        if response.status_code == 304:
+            trace.count("preview.cache_hit")
+            return None, None, None
+        response.raise_for_status()
+        trace.count("preview.cache_miss")
+        fd, tmp_path = tempfile.mkstemp(prefix=".download-", suffix=".gif", dir=SCALED_DIR)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+                span["bytes"] = f.tell()
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+def _copy_local_preview(path, headers=None):
+    # file://-Vorschauen aus einem lokalen Spiegel; die mtime ersetzt Last-Modified
+    last_modified = formatdate(os.path.getmtime(path), usegmt=True)
+    if headers and headers.get("If-Modified-Since") == last_modified:
+        trace.count("preview.cache_hit")
+        return None, None, None
+    trace.count("preview.cache_miss")
+    fd, tmp_path = tempfile.mkstemp(prefix=".download-", suffix=".gif", dir=SCALED_DIR)
+    os.close(fd)
+    shutil.copyfile(path, tmp_path)
+    return tmp_path, None, last_modified
+
+class GifWriter:
+    # Schreibt ein animiertes GIF Frame für Frame. Die globale Palette stammt aus dem ersten Frame;
+    # Frames mit Farben, die darin fehlen (z. B. nach einem schwarzen Einblenden), bekommen eine eigene
+    def __init__(self, fp, size, loop=0):
+        self.fp = fp
+        self.size = size
+        self.loop = loop
+        self.palette_image = None
+
+    @staticmethod
+    def _palette(rgb):
+        palette = rgb.quantize(colors=TRANSPARENT_INDEX).getpalette()[:3 * TRANSPARENT_INDEX]
+        # Auffüllen mit der ersten Farbe: bei Gleichstand gewinnt beim Quantisieren der kleinere Index,
+        # dadurch wird TRANSPARENT_INDEX nie für echte Pixel gewählt
+        palette += palette[:3] * (256 - len(palette) // 3)
+        palette_image = Image.new("P", (1, 1))
+        palette_image.putpalette(palette)
+        return palette, palette_image
+
+    def _write_header(self, rgb):
+        palette, self.palette_image = self._palette(rgb)
+        width, height = self.size
+        self.fp.write(b"GIF89a" + struct.pack("<HHBBB", width, height, 0xF7, 0, 0))
+        self.fp.write(bytes(palette))
+        self.fp.write(b"!\xff\x0bNETSCAPE2.0" + struct.pack("<BBHB", 3, 1, self.loop, 0))
+
+    def _covered(self, rgb, indexed):
+        # Weicht ein Pixel nach dem Abbilden auf die globale Palette stark ab, fehlt seine Farbe darin
+        difference = ImageChops.difference(rgb, indexed.convert("RGB"))
+        return max(high for _, high in difference.getextrema()) <= PALETTE_TOLERANCE
+
+    def write_frame(self, frame, duration, disposal=0):
+        rgba = frame.convert("RGBA")
+        rgb = rgba.convert("RGB")
+        if self.palette_image is None:
+            self._write_header(rgb)
+
+        local_palette = None
+        indexed = rgb.quantize(palette=self.palette_image)
+        if not self._covered(rgb, indexed):
+            local_palette, palette_image = self._palette(rgb)
+            indexed = rgb.quantize(palette=palette_image)
+        alpha = rgba.getchannel("A")
+        transparent = alpha.getextrema()[0] < 128
+        if transparent:
+            indexed.paste(TRANSPARENT_INDEX, mask=alpha.point(lambda a: 255 if a < 128 else 0))
 
-    response = requests.get(preview_url)
-    response.raise_for_status()
+        packed = (disposal & 7) << 2 | (1 if transparent else 0)
+        delay = int(duration / 10)
+        self.fp.write(b"!\xf9" + struct.pack("<BBHBB", 4, packed, delay, TRANSPARENT_INDEX, 0))
+        # Bit 7: lokale Farbtabelle folgt, Bits 0-2: Größe 2^(7+1) = 256 Einträge
+        flags = 0x87 if local_palette else 0
+        self.fp.write(b"," + struct.pack("<HHHHB", 0, 0, self.size[0], self.size[1], flags))
+        if local_palette:
+            self.fp.write(bytes(local_palette))
+            trace.count("preview.local_palette")
+        self.fp.write(b"\x08" + indexed.tobytes("gif", "P") + b"\x00")
 
-    img_bytes = BytesIO(response.content)
+    def close(self):
+        self.fp.write(b";")
+
+def scale_gif(source, gif_path, max_fps=None, max_frames=None):
+    # CPU-lastiger Teil, läuft auch in einem Worker-Prozess. Es wird immer nur ein Frame
+    # dekodiert, skaliert und geschrieben, der Speicherbedarf hängt nicht von der Länge ab.
+    tmp_path = f"{gif_path}.{os.getpid()}.tmp"
     try:
-        img = Image.open(img_bytes)
-        frames = []
-        for frame in range(img.n_frames):
-            img.seek(frame)
-            frame_img = img.copy()
-            frame_img = frame_img.convert("RGBA")
-            ratio = 192 / img.height
-            new_width = int(img.width * ratio)
-            frame_img = frame_img.resize((new_width, 192), Image.LANCZOS)
-            frames.append(frame_img)
-
-        frames[0].save(gif_path, save_all=True, append_images=frames[1:], loop=0, duration=img.info.get('duration', 100))
+        with Image.open(source) as img:
+            ratio = PREVIEW_HEIGHT / img.height
+            size = (max(1, int(img.width * ratio)), PREVIEW_HEIGHT)
+            step = math.ceil(img.n_frames / max_frames) if max_frames else 1
+            min_interval = 1000 / max_fps if max_fps else 0
+
+            laps = trace.Laps()
+            written = 0
+            with open(tmp_path, "wb") as fp:
+                writer = GifWriter(fp, size)
+                # Ein Frame wird zurückgehalten, damit die Dauer ausgelassener Frames
+                # auf den zuletzt behaltenen Frame addiert werden kann
+                pending = None
+                for index, frame in enumerate(ImageSequence.Iterator(img)):
+                    laps.lap("decode")
+                    duration = img.info.get("duration", 100)
+                    if pending is not None and (index % step or pending[1] < min_interval):
+                        pending[1] += duration
+                        continue
+                    if pending is not None:
+                        writer.write_frame(*pending)
+                        written += 1
+                        laps.lap("encode")
+                    disposal = getattr(img, "disposal_method", 0)
+                    rgba = frame.convert("RGBA")
+                    laps.lap("decode")
+                    pending = [rgba.resize(size, Image.LANCZOS), duration, disposal]
+                    laps.lap("resize")
+                writer.write_frame(*pending)
+                writer.close()
+                written += 1
+                laps.lap("encode")
+        os.replace(tmp_path, gif_path)
+        laps.record("preview", frames=written, bytes=os.path.getsize(gif_path))
         return gif_path
     except Exception as e:
         print("Fehler bei GIF-Skalierung:", e)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise
 
+def get_or_create_scaled_gif(theme_name, preview_url, max_fps=None, max_frames=None):
+    os.makedirs(SCALED_DIR, exist_ok=True)
+    cache = get_cache()
+    key = preview_key(preview_url, max_fps, max_frames)
+    entry = cache.lookup(key)
+
+    try:
+        download_path, etag, last_modified = download_preview(preview_url, cache.conditional_headers(entry))
+    except requests.RequestException:
+        # Offline: vorhandene Vorschau weiterverwenden
+        if entry is None:
+            raise
+        download_path = None
+
+    try:
+        if download_path is None:
+            cache.touch(key)
+            return cache.path(key)
+        try:
+            scale_gif(download_path, cache.path(key), max_fps, max_frames)
+        finally:
+            os.remove(download_path)
+        return cache.store(key, theme_name, preview_url, etag, last_modified)
+    finally:
+        cache.flush()
+
+def scale_gifs(previews, max_downloads=MAX_DOWNLOADS, processes=None, max_fps=None, max_frames=None):
+    # previews: Liste von (name, preview_url); liefert (name, gif_path, fehler),
+    # sobald das jeweilige GIF fertig ist
+    os.makedirs(SCALED_DIR, exist_ok=True)
+    cache = get_cache()
+    jobs = {}
+    # "spawn", weil der Aufrufer (GUI) bereits Threads laufen hat
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ThreadPoolExecutor(max_workers=max_downloads) as download_pool, \
+                ProcessPoolExecutor(max_workers=processes, mp_context=context) as scale_pool:
+            for name, preview_url in previews:
+                if not preview_url:
+                    yield name, None, ValueError("keine preview_url")
+                    continue
+                key = preview_key(preview_url, max_fps, max_frames)
+                entry = cache.lookup(key)
+                future = download_pool.submit(download_preview, preview_url, cache.conditional_headers(entry))
+                jobs[future] = ("download", name, preview_url, key, entry)
+
+            pending = set(jobs)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step, name, preview_url, key, info = jobs.pop(future)
+                    if step == "download":
+                        try:
+                            download_path, etag, last_modified = future.result()
+                        except Exception as e:
+                            # info ist hier der bisherige Cache-Eintrag
+                            if info is not None and isinstance(e, requests.RequestException):
+                                cache.touch(key)
+                                yield name, cache.path(key), None
+                            else:
+                                yield name, None, e
+                            continue
+                        if download_path is None:
+                            cache.touch(key)
+                            yield name, cache.path(key), None
+                            continue
+                        scale_future = scale_pool.submit(scale_gif, download_path, cache.path(key), max_fps, max_frames)
+                        jobs[scale_future] = ("scale", name, preview_url, key, (download_path, etag, last_modified))
+                        pending.add(scale_future)
+                    else:
+                        download_path, etag, last_modified = info
+                        os.remove(download_path)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            yield name, None, e
+                            continue
+                        yield name, cache.store(key, name, preview_url, etag, last_modified), None
+    finally:
+        cache.flush()
@@ -0,0 +1,160 @@
+import os
+import json
+import configparser
+from ptm.config import CONFIG_DIR, Section, cache_dir, write_atomic
+from ptm import trace
+
+# Installierte Themes ohne update-alternatives-Aufruf: Die Statusdatei von dpkg und
+# PLYMOUTH_THEMES_DIR werden direkt gelesen. Das Ergebnis liegt in einem Index und wird
+# nur neu erstellt, wenn sich die mtime der Statusdatei oder eines Theme-Verzeichnisses ändert.
+
+PLYMOUTH_THEMES_DIR = os.environ.get("PTM_THEMES_DIR", "/usr/share/plymouth/themes")
+# Von dpkg gepflegter Zustand der Alternative default.plymouth
+ALTERNATIVES_FILE = os.environ.get("PTM_ALTERNATIVES_FILE", "/var/lib/dpkg/alternatives/default.plymouth")
+INDEX_FILE = os.path.join(cache_dir(CONFIG_DIR), "themes.index.json")
+INDEX_VERSION = 1
+
+_index = None
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def read_alternatives(path=ALTERNATIVES_FILE):
+    # Format der dpkg-Statusdatei: Modus, Link, Paare aus Slave-Name und -Link bis zur
+    # Leerzeile, danach je Alternative Pfad, Priorität und eine Zeile pro Slave
+    try:
+        with open(path) as f:
+            lines = f.read().split("\n")
+    except OSError:
+        return None
+    lines = iter(lines)
+    mode = next(lines, "")
+    next(lines, "")
+    slaves = 0
+    while next(lines, ""):
+        next(lines, "")
+        slaves += 1
+    alternatives = {}
+    for target in lines:
+        if not target:
+            break
+        priority = next(lines, "0")
+        for _ in range(slaves):
+            next(lines, "")
+        alternatives[target] = int(priority) if priority.lstrip("-").isdigit() else 0
+    return {"mode": mode, "alternatives": alternatives}
+
+def parse_plymouth_file(path):
+    parser = configparser.ConfigParser(interpolation=None, strict=False)
+    parser.optionxform = str
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            parser.read_file(f)
+    except (OSError, configparser.Error):
+        return None
+    if not parser.has_section("Plymouth Theme"):
+        return None
+    header = parser["Plymouth Theme"]
+    module = header.get("ModuleName", "")
+    # Die Modul-Sektion heißt wie das Modul, z. B. [script] oder [two-step]
+    options = parser[module] if module and parser.has_section(module) else {}
+    image_dir = options.get("ImageDir", "")
+    return {
+        "name": header.get("Name", ""),
+        "description": header.get("Description", ""),
+        "module": module,
+        "image_dir": image_dir,
+        "script_file": options.get("ScriptFile", ""),
+    }
+
+def _scan_theme_dir(theme_dir):
+    entry = {"mtime": _mtime(theme_dir), "files": {}}
+    try:
+        names = os.listdir(theme_dir)
+    except OSError:
+        return entry
+    for name in names:
+        if name.endswith(".plymouth"):
+            info = parse_plymouth_file(os.path.join(theme_dir, name))
+            if info is not None:
+                entry["files"][name] = info
+    return entry
+
+def _load_index():
+    global _index
+    if _index is None:
+        try:
+            with open(INDEX_FILE) as f:
+                index = json.load(f)
+            if index.get("version") == INDEX_VERSION and index.get("themes_dir") == PLYMOUTH_THEMES_DIR:
+                _index = index
+        except (OSError, ValueError):
+            pass
+    return _index or {"version": INDEX_VERSION, "themes_dir": PLYMOUTH_THEMES_DIR, "dirs": {}}
+
+def _save_index(index):
+    global _index
+    _index = index
+    try:
+        os.makedirs(os.path.dirname(INDEX_FILE), exist_ok=True)
+        write_atomic(INDEX_FILE, json.dumps(index).encode("utf-8"))
+    except OSError:
+        # Ohne Schreibrechte bleibt der Index nur im Speicher
+        pass
+
+def scan(force=False):
+    # Liefert {Pfad der .plymouth-Datei: Header-Infos + "priority" (None, wenn nicht registriert)}
+    with trace.span("themes.scan") as span:
+        index = _load_index()
+        changed = force
+        dirs = {}
+        try:
+            names = sorted(os.listdir(PLYMOUTH_THEMES_DIR))
+        except OSError:
+            names = []
+        for name in names:
+            theme_dir = os.path.join(PLYMOUTH_THEMES_DIR, name)
+            if name.startswith(".") or not os.path.isdir(theme_dir):
+                continue
+            cached = index["dirs"].get(name)
+            # Nur Verzeichnisse mit geänderter mtime werden neu gelesen
+            if not force and cached and cached["mtime"] == _mtime(theme_dir):
+                dirs[name] = cached
+            else:
+                dirs[name] = _scan_theme_dir(theme_dir)
+                changed = True
+        changed = changed or dirs.keys() != index["dirs"].keys()
+
+        alternatives_mtime = _mtime(ALTERNATIVES_FILE)
+        if force or "alternatives" not in index or index.get("alternatives_mtime") != alternatives_mtime:
+            index["alternatives"] = read_alternatives()
+            index["alternatives_mtime"] = alternatives_mtime
+            changed = True
+
+        if changed:
+            index["dirs"] = dirs
+            _save_index(index)
+        span["rescanned"] = changed
+
+    registered = (index["alternatives"] or {}).get("alternatives", {})
+    themes = {}
+    for name, entry in dirs.items():
+        for file_name, info in entry["files"].items():
+            path = os.path.join(PLYMOUTH_THEMES_DIR, name, file_name)
+            themes[path] = dict(info, theme=name, priority=registered.get(path))
+    return themes
+
+def installed_themes(force=False, themes=None):
+    # Theme-Verzeichnis -> Pfad der .plymouth-Datei, Namen wie in ptm.conf klein geschrieben.
+    # Ohne dpkg-Statusdatei (andere Distributionen) zählt jede vorhandene .plymouth-Datei.
+    # Katalognamen ordnet theme_handler.installed_by_name() zu.
+    themes = scan(force) if themes is None else themes
+    has_alternatives = (_index or {}).get("alternatives") is not None
+    installed = Section()
+    for path, info in themes.items():
+        if not has_alternatives or info["priority"] is not None:
+            installed[info["theme"].lower()] = path
+    return installed
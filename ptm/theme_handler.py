@@ -1,106 +1,457 @@
 import os
+import re
+import json
+import time
+import hashlib
 import subprocess
 import shutil
 import tarfile
 import tempfile
-import requests
-from ptm.config import mark_theme_installed, remove_installed_theme, get_installed_themes
+from urllib.parse import urlparse, unquote
+from ptm.config import (store, remove_installed_theme, get_installed_themes, Section,
+                        get_theme_dirs, set_theme_dir, write_atomic)
+from ptm.preview_cache import find_cached_preview
+from ptm.scanner import PLYMOUTH_THEMES_DIR, scan, installed_themes
+from ptm import trace
 
-PLYMOUTH_THEMES_DIR = "/usr/share/plymouth/themes"
-PREVIEW_DIR = "/usr/share/icons/animated/themes"
+DEFAULT_PLYMOUTH_LINK = os.path.join(PLYMOUTH_THEMES_DIR, "default.plymouth")
+ALTERNATIVE_NAME = "default.plymouth"
+INSTALL_PRIORITY = "100"
+BOOT_DIR = os.environ.get("PTM_BOOT_DIR", "/boot")
+ARCHIVE_CACHE_DIR = os.environ.get("PTM_ARCHIVE_DIR", "/var/cache/plymouth-theme-manager/archives")
+# Vorbefülltes Verzeichnis mit Archiven (z. B. Netzlaufwerk), wird vor dem Download durchsucht
+MIRROR_DIR = os.environ.get("PTM_MIRROR_DIR")
+DOWNLOAD_TIMEOUT = 30
 
-def install_theme(theme_name, download_url):
-    tmp_dir = tempfile.mkdtemp(prefix="ptm_install_")
-    tar_path = os.path.join(tmp_dir, f"{theme_name}.tar.gz")
+def _run(args):
+    # Im privilegierten Helfer (root) ohne sudo
+    command = list(args) if os.geteuid() == 0 else ["sudo", *args]
+    with trace.span(f"subprocess.{args[0]}", args=" ".join(args[1:])):
+        subprocess.run(command, check=True)
 
+def plymouth_path(theme_name):
+    return os.path.join(PLYMOUTH_THEMES_DIR, theme_name, f"{theme_name}.plymouth")
+
+def current_default():
+    # Ziel von default.plymouth, ohne update-alternatives aufzurufen
+    if not os.path.exists(DEFAULT_PLYMOUTH_LINK):
+        return None
+    return os.path.realpath(DEFAULT_PLYMOUTH_LINK)
+
+def _kernel_sort_key(version):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", version)]
+
+def relevant_kernels():
+    # Der laufende und der neueste Kernel mit initramfs; ältere booten in der Regel nicht mehr
     try:
-        r = requests.get(download_url, stream=True, timeout=30)
-        r.raise_for_status()
-        with open(tar_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
-
-        with tarfile.open(tar_path, "r:gz") as tar:
-            tar.extractall(path=tmp_dir)
-
-        found = None
-        for root, dirs, files in os.walk(tmp_dir):
-            for file in files:
-                if file.endswith(".plymouth"):
-                    found = os.path.join(root, file)
-                    break
-            if found:
-                break
+        kernels = [name[len("initrd.img-"):] for name in os.listdir(BOOT_DIR) if name.startswith("initrd.img-")]
+    except OSError:
+        return []
+    if not kernels:
+        return []
+    relevant = {max(kernels, key=_kernel_sort_key)}
+    running = os.uname().release
+    if running in kernels:
+        relevant.add(running)
+    return sorted(relevant, key=_kernel_sort_key)
 
-        if not found:
-            print("❌ .plymouth-Datei nicht gefunden im Archiv")
-            return False
+def initramfs_sizes(kernels=None):
+    kernels = relevant_kernels() if kernels is None else kernels
+    sizes = {}
+    for kernel in kernels:
+        try:
+            sizes[kernel] = os.path.getsize(os.path.join(BOOT_DIR, f"initrd.img-{kernel}"))
+        except OSError:
+            pass
+    return sizes
 
-        real_name = os.path.splitext(os.path.basename(found))[0]
-        theme_dir = os.path.join(PLYMOUTH_THEMES_DIR, real_name)
-        os.makedirs(theme_dir, exist_ok=True)
-
-        extracted_root = os.path.dirname(found)
-        for item in os.listdir(extracted_root):
-            s = os.path.join(extracted_root, item)
-            d = os.path.join(theme_dir, item)
-            if os.path.isdir(s):
-                shutil.copytree(s, d, dirs_exist_ok=True)
-            else:
-                shutil.copy2(s, d)
-
-        plymouth_target = os.path.join(theme_dir, f"{real_name}.plymouth")
-        subprocess.run([
-            "sudo", "update-alternatives", "--install",
-            "/usr/share/plymouth/themes/default.plymouth",
-            "default.plymouth",
-            plymouth_target,
-            "100"
-        ], check=True)
-
-        subprocess.run(["sudo", "update-initramfs", "-u"], check=True)
-        return True
-
-    except Exception as e:
-        print(f"❌ Fehler bei Installation von {theme_name}: {e}")
-        return False
+def rebuild_initramfs(kernels=None):
+    kernels = relevant_kernels() if kernels is None else kernels
+    if not kernels:
+        _run(["update-initramfs", "-u"])
+        return
+    for kernel in kernels:
+        _run(["update-initramfs", "-u", "-k", kernel])
+
+def _member_allowed(member):
+    # Ersatz für tarfile-Filter auf Python-Versionen ohne filter="data"
+    parts = member.name.split("/")
+    return not (member.name.startswith("/") or ".." in parts or member.issym() or member.islnk()
+                or member.isdev() or member.isfifo())
 
+def _extract_stream(fileobj, dest):
+    # "r|gz" liest das Archiv in einem Durchgang direkt aus dem Datenstrom.
+    # Sobald die .plymouth-Datei bekannt ist, wird nur noch ihr Verzeichnis entpackt.
+    found = None
+    root = None
+    with trace.span("archive.extract") as span, tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+        span["files"] = span["bytes"] = 0
+        for member in tar:
+            if root is not None and not (member.name + "/").startswith(root):
+                continue
+            span["files"] += 1
+            span["bytes"] += member.size
+            if hasattr(tarfile, "data_filter"):
+                tar.extract(member, dest, filter="data")
+            elif _member_allowed(member):
+                member.uid = member.gid = 0
+                tar.extract(member, dest)
+            if found is None and member.isfile() and member.name.endswith(".plymouth"):
+                found = member.name
+                root = os.path.dirname(found) + "/" if os.path.dirname(found) else None
+    return found
+
+def _replace_dir(source, theme_dir):
+    # Das alte Verzeichnis wird erst beiseitegelegt und nach dem Umbenennen gelöscht
+    old_dir = None
+    if os.path.exists(theme_dir):
+        old_dir = tempfile.mkdtemp(prefix=".ptm-old-", dir=PLYMOUTH_THEMES_DIR)
+        os.rename(theme_dir, os.path.join(old_dir, "theme"))
+    try:
+        os.rename(source, theme_dir)
+    except Exception:
+        if old_dir:
+            os.rename(os.path.join(old_dir, "theme"), theme_dir)
+        raise
     finally:
-        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
 
-def uninstall_theme_full(theme_name):
-    plymouth_path = os.path.join(PLYMOUTH_THEMES_DIR, theme_name, f"{theme_name}.plymouth")
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _archive_ok(path, sha256):
+    return os.path.isfile(path) and (not sha256 or _file_sha256(path) == sha256.lower())
+
+def _archive_name(download_url, sha256=None):
+    # Mit Prüfsumme ist der Inhalt der Schlüssel, sonst die URL
+    if sha256:
+        return f"{sha256.lower()}.tar.gz"
+    return hashlib.sha256(download_url.encode("utf-8")).hexdigest()[:32] + ".tar.gz"
+
+def _local_sources(download_url, sha256=None):
+    url = urlparse(download_url)
+    if url.scheme == "file":
+        yield unquote(url.path)
+    if MIRROR_DIR:
+        if sha256:
+            yield os.path.join(MIRROR_DIR, _archive_name(download_url, sha256))
+        yield os.path.join(MIRROR_DIR, os.path.basename(unquote(url.path)))
 
+def _read_validators(path):
     try:
-        if os.path.exists(plymouth_path):
-            subprocess.run([
-                "sudo", "update-alternatives", "--remove", "default.plymouth", plymouth_path
-            ], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Fehler beim Entfernen aus update-alternatives: {e}")
-        return False
-
-    theme_dir = os.path.join(PLYMOUTH_THEMES_DIR, theme_name)
-    if os.path.isdir(theme_dir):
-        try:
-            shutil.rmtree(theme_dir)
-            print(f"Theme-Verzeichnis {theme_dir} gelöscht.")
-        except Exception as e:
-            print(f"Fehler beim Löschen des Theme-Verzeichnisses: {e}")
+        with open(path + ".json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    gif_path = os.path.join(PREVIEW_DIR, f"{theme_name}_preview.gif")
-    if os.path.exists(gif_path):
-        try:
-            os.remove(gif_path)
-            print(f"Vorschau-Datei {gif_path} gelöscht.")
-        except Exception as e:
-            print(f"Fehler beim Löschen der Vorschau-Datei: {e}")
+def _write_validators(path, response):
+    validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+    write_atomic(path + ".json", json.dumps(validators).encode("utf-8"))
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def fetch_archive(download_url, sha256=None):
+    # Liefert den Pfad eines geprüften Archivs: aus dem Cache, einem lokalen Spiegel
+    # oder per (fortsetzbarem) Download. Ohne Prüfsumme wird der Cache per ETag/Last-Modified
+    # beim Server nachgefragt, wie bei den Vorschauen.
+    cached = os.path.join(ARCHIVE_CACHE_DIR, _archive_name(download_url, sha256))
+    with trace.span("archive.verify"):
+        if sha256 and _archive_ok(cached, sha256):
+            trace.count("archive.cache_hit")
+            return cached
+        for path in _local_sources(download_url, sha256):
+            if _archive_ok(path, sha256):
+                trace.count("archive.mirror_hit")
+                return path
+    if urlparse(download_url).scheme == "file":
+        raise FileNotFoundError(f"Archiv nicht gefunden oder Prüfsumme falsch: {download_url}")
 
+    import requests
+
+    os.makedirs(ARCHIVE_CACHE_DIR, exist_ok=True)
+    part = cached + ".part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {}
+    if offset:
+        # Fortsetzen nur, wenn der Server noch dieselbe Datei hat; sonst liefert er sie mit 200 ganz
+        validators = _read_validators(part)
+        if_range = validators.get("etag") or validators.get("last_modified")
+        if if_range:
+            headers = {"Range": f"bytes={offset}-", "If-Range": if_range}
+        else:
+            _remove(part)
+            offset = 0
+    elif os.path.isfile(cached):
+        validators = _read_validators(cached)
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    try:
+        with trace.span("archive.download", url=download_url, offset=offset) as span, \
+                requests.get(download_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+            span["status"] = r.status_code
+            if r.status_code == 304:
+                trace.count("archive.revalidated")
+                return cached
+            if r.status_code == 416:
+                # Teildatei passt nicht mehr zum Server-Stand, von vorn beginnen
+                _remove(part, part + ".json")
+                return fetch_archive(download_url, sha256)
+            r.raise_for_status()
+            trace.count("archive.cache_miss")
+            resumed = r.status_code == 206
+            if not resumed:
+                _write_validators(part, r)
+            # 206: Server setzt fort; 200: neue oder geänderte Datei, von vorn schreiben
+            with open(part, "ab" if resumed else "wb") as f:
+                for chunk in r.iter_content(chunk_size=65536):
+                    f.write(chunk)
+                span["bytes"] = f.tell() - offset if resumed else f.tell()
+    except (requests.ConnectionError, requests.Timeout):
+        # Offline: vorhandenes Archiv weiterverwenden. HTTP-Fehler (404, 500 …) werden weitergereicht,
+        # ein vom Server entferntes oder geändertes Theme soll nicht still aus dem Cache kommen
+        if sha256 or not os.path.isfile(cached):
+            raise
+        print(f"Server nicht erreichbar, verwende zwischengespeichertes Archiv: {download_url}")
+        return cached
+
+    if not _archive_ok(part, sha256):
+        _remove(part, part + ".json")
+        raise ValueError(f"Prüfsumme des Archivs stimmt nicht: {download_url}")
+    os.replace(part, cached)
+    os.replace(part + ".json", cached + ".json")
+    return cached
+
+def _install_files(theme_name, download_url, sha256=None, optimize=None):
+    # Staging-Verzeichnis neben dem Ziel, damit das Umbenennen atomar im selben Dateisystem bleibt
+    os.makedirs(PLYMOUTH_THEMES_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".ptm-staging-", dir=PLYMOUTH_THEMES_DIR)
+
+    try:
+        with open(fetch_archive(download_url, sha256), "rb") as f:
+            found = _extract_stream(f, staging)
+
+        if not found:
+            raise RuntimeError(".plymouth-Datei nicht gefunden im Archiv")
+
+        real_name = os.path.splitext(os.path.basename(found))[0]
+        source = os.path.join(staging, os.path.dirname(found))
+        os.chmod(source, 0o755)
+        report = None
+        if optimize:
+            # Noch im Staging-Verzeichnis, das aktive Theme bleibt bis zum Umbenennen unverändert
+            from ptm.optimize import optimize_theme, parse_resolution, format_report
+            report = optimize_theme(source, parse_resolution(optimize))
+            print(f"{real_name} optimiert: {format_report(report)}")
+        with trace.span("archive.move", theme=real_name):
+            _replace_dir(source, os.path.join(PLYMOUTH_THEMES_DIR, real_name))
+        return plymouth_path(real_name), report
+
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def _remove_files(theme_name):
+    # Nur Themes, die dieses Programm installiert hat; bgrt, spinner usw. gehören dpkg
+    theme_dirs = get_theme_dirs()
+    if theme_name not in theme_dirs and theme_name not in get_installed_themes():
+        raise PermissionError(f"Theme wurde nicht vom Theme Manager installiert: {theme_name}")
+    target = find_installed(theme_name)
+    if target is None:
+        raise FileNotFoundError(f"Theme ist nicht installiert: {theme_name}")
+    directory = theme_dirs.get(theme_name)
+    if directory and os.path.basename(os.path.dirname(target)) != directory:
+        raise PermissionError(f"{os.path.dirname(target)} ist nicht das Verzeichnis von {theme_name}")
+    _run(["update-alternatives", "--remove", ALTERNATIVE_NAME, target])
+
+    theme_dir = os.path.dirname(target)
+    shutil.rmtree(theme_dir)
+    print(f"Theme-Verzeichnis {theme_dir} gelöscht.")
+
+    # Die Vorschau bleibt im Vorschau-Cache, die Karte im Katalog zeigt sie weiterhin an
     remove_installed_theme(theme_name)
+    return theme_dir
+
+class ThemeTransaction:
+    # Sammelt Installationen, Deinstallationen und Standard-Wechsel und baut das
+    # initramfs höchstens einmal neu, und nur wenn sich das aktive Theme geändert hat
+    def __init__(self):
+        self.actions = []
+        # Nach commit(): Optimierungsberichte je Theme und initramfs-Größen vorher/nachher
+        self.report = {}
+
+    def __len__(self):
+        return len(self.actions)
+
+    def install(self, theme_name, download_url, sha256=None, optimize=None):
+        # optimize: maximale Auflösung "BREITExHÖHE", die Bilder werden vorher verkleinert (ptm/optimize.py)
+        self.actions.append(("install", theme_name, (download_url, sha256, optimize)))
+        return self
+
+    def uninstall(self, theme_name):
+        self.actions.append(("uninstall", theme_name, ()))
+        return self
+
+    def set_default(self, theme_name):
+        self.actions.append(("set_default", theme_name, ()))
+        return self
+
+    def _apply(self, action, theme_name, args, targets, touched):
+        if action == "install":
+            target, report = _install_files(theme_name, *args)
+            targets[theme_name] = target
+            # Katalognamen und Verzeichnis können verschieden sein (Black-HUD -> black_hud)
+            set_theme_dir(theme_name, os.path.basename(os.path.dirname(target)))
+            if report:
+                self.report.setdefault("themes", {})[theme_name] = report
+            _run(["update-alternatives", "--install", DEFAULT_PLYMOUTH_LINK, ALTERNATIVE_NAME, target, INSTALL_PRIORITY])
+            touched.add(os.path.dirname(target))
+        elif action == "uninstall":
+            touched.add(_remove_files(theme_name))
+        elif action == "set_default":
+            target = targets.get(theme_name) or find_installed(theme_name)
+            if target is None:
+                raise FileNotFoundError(f"Theme ist nicht installiert: {theme_name}")
+            _run(["update-alternatives", "--set", ALTERNATIVE_NAME, target])
 
+    def commit(self, progress=None):
+        # Liefert eine Liste von (aktion, theme_name, erfolgreich), nach einem initramfs-Neubau
+        # zusätzlich ("rebuild-initramfs", "", erfolgreich);
+        # progress(aktion, theme_name, zustand) wird vor und nach jedem Schritt aufgerufen
+        progress = progress or (lambda action, theme_name, state: None)
+        actions, self.actions = self.actions, []
+        self.report = {}
+        before = current_default()
+        targets = {}
+        touched = set()
+        results = []
+
+        for action, theme_name, args in actions:
+            progress(action, theme_name, "start")
+            try:
+                with trace.span(f"transaction.{action}", theme=theme_name):
+                    self._apply(action, theme_name, args, targets, touched)
+                results.append((action, theme_name, True))
+                progress(action, theme_name, "done")
+            except Exception as e:
+                print(f"❌ Fehler bei {action} von {theme_name}: {e}")
+                trace.event("transaction.error", action=action, theme=theme_name, error=str(e))
+                results.append((action, theme_name, False))
+                progress(action, theme_name, "failed")
+
+        after = current_default()
+        # Neu bauen, wenn ein anderes Theme aktiv ist oder die Dateien des aktiven Themes ersetzt wurden
+        if after != before or (after and os.path.dirname(after) in touched):
+            progress("rebuild-initramfs", "", "start")
+            try:
+                sizes = initramfs_sizes()
+                rebuild_initramfs()
+                self.report["initramfs"] = {kernel: (size, initramfs_sizes([kernel]).get(kernel, 0))
+                                            for kernel, size in sizes.items()}
+                results.append(("rebuild-initramfs", "", True))
+                progress("rebuild-initramfs", "", "done")
+            except Exception as e:
+                print(f"Fehler beim Aktualisieren von initramfs: {e}")
+                results.append(("rebuild-initramfs", "", False))
+                progress("rebuild-initramfs", "", "failed")
+        return results
+
+def _normalize(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+def _match_installed(theme_name, installed, headers, theme_dirs):
+    # Das bei der Installation gespeicherte Verzeichnis gilt allein (sonst träfe der Vergleich
+    # womöglich ein fremdes Theme), ohne eines gleichnamige Verzeichnisse und Name=-Angaben,
+    # verglichen ohne Satz- und Leerzeichen
+    directory = theme_dirs.get(theme_name)
+    if directory:
+        return installed.get(directory)
+    if theme_name in installed:
+        return installed[theme_name]
+    key = _normalize(theme_name)
+    for directory, path in installed.items():
+        if key in (_normalize(directory), _normalize(headers.get(path, ""))):
+            return path
+    return None
+
+def installed_by_name(names=()):
+    # Katalogname -> Pfad der .plymouth-Datei, für alle installierten Themes. names ergänzt
+    # die aus ptm.conf bekannten Namen, z. B. um den aktuellen Katalog.
+    themes = scan()
+    installed = installed_themes(themes=themes)
+    headers = {path: info["name"] for path, info in themes.items()}
+    theme_dirs = get_theme_dirs()
+    result = Section()
+    claimed = set()
+    for name in [*theme_dirs, *get_installed_themes(), *(name.lower() for name in names if name)]:
+        if name in result:
+            continue
+        path = _match_installed(name, installed, headers, theme_dirs)
+        if path:
+            result[name] = path
+            claimed.add(path)
+    # Themes ohne Katalogeintrag unter ihrem Verzeichnisnamen
+    for directory, path in installed.items():
+        if path not in claimed:
+            result[directory] = path
+    return result
+
+def find_installed(theme_name):
+    return installed_by_name([theme_name]).get(theme_name)
+
+def sync_installed_themes(names=()):
+    # Gleicht [installed] und [theme_dirs] mit den tatsächlich registrierten Themes ab.
+    # Liefert alle installierten Themes, eingetragen werden aber nur die von diesem
+    # Programm installierten, sonst böte die Deinstallation auch Themes der Distribution an.
+    installed = installed_by_name(names)
+    recorded = get_installed_themes()
+    theme_dirs = get_theme_dirs()
+    try:
+        # Ein einziger Schreibvorgang für alle Themes, und nur wenn sich etwas geändert hat
+        with store.batch():
+            for name, path in installed.items():
+                if name not in recorded and name not in theme_dirs:
+                    continue
+                gif_path = find_cached_preview(name) or recorded.get(name, "")
+                if recorded.get(name) != gif_path:
+                    store.set("installed", name, gif_path)
+                # Einträge älterer Versionen ohne Verzeichnis bekommen ihres
+                directory = os.path.basename(os.path.dirname(path))
+                if name not in theme_dirs:
+                    store.set("theme_dirs", name, directory)
+            for name in recorded:
+                if name not in installed:
+                    store.remove("installed", name)
+            for name in get_theme_dirs():
+                if name not in installed:
+                    store.remove("theme_dirs", name)
+    except OSError as e:
+        print("Konfiguration konnte nicht gespeichert werden:", e)
+    return installed
+
+def show_splash(seconds=5):
+    # Zeigt den Boot-Splash des aktiven Themes für einige Sekunden (braucht Root)
+    if subprocess.run(["pgrep", "plymouthd"], capture_output=True).returncode != 0:
+        _run(["plymouthd"])
+    _run(["plymouth", "--show-splash"])
     try:
-        subprocess.run(["sudo", "update-initramfs", "-uk", "all"], check=True)
-    except Exception as e:
-        print(f"Fehler beim Aktualisieren von initramfs: {e}")
+        time.sleep(seconds)
+    finally:
+        _run(["plymouth", "quit"])
+
+def install_theme(theme_name, download_url, sha256=None, optimize=None):
+    results = ThemeTransaction().install(theme_name, download_url, sha256, optimize).commit()
+    return all(ok for _, _, ok in results)
 
-    return True
+def uninstall_theme_full(theme_name):
+    results = ThemeTransaction().uninstall(theme_name).commit()
+    return all(ok for _, _, ok in results)
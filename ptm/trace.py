@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import uuid
+import tempfile
+import atexit
+import threading
+import multiprocessing
+from contextlib import contextmanager
+
+# Zeitmessung einzelner Phasen. Aktiv über PTM_TRACE oder --trace:
+#   PTM_TRACE=1              Zusammenfassung am Ende auf stderr
+#   PTM_TRACE=/pfad.jsonl    zusätzlich jede Messung als JSON-Zeile behalten
+# Messungen aus Worker-Prozessen laufen immer über eine Datei; bei PTM_TRACE=1 ist das eine
+# temporäre Datei, die nach der Zusammenfassung gelöscht wird.
+
+_lock = threading.Lock()
+_enabled = False
+_path = None
+_run_id = None
+_stats = {}
+_counters = {}
+_summary_registered = False
+_temporary = False
+
+def configure(target):
+    global _enabled, _path, _run_id, _summary_registered, _temporary
+    if not target or target == "0":
+        return
+    _enabled = True
+    if target not in ("1", "true", "stderr"):
+        _path = os.path.abspath(target)
+        _temporary = False
+    elif not _temporary:
+        fd, _path = tempfile.mkstemp(prefix="ptm-trace-", suffix=".jsonl")
+        os.close(fd)
+        _temporary = True
+    # Worker-Prozesse (spawn) erben die Variablen und schreiben in dieselbe Datei
+    os.environ["PTM_TRACE"] = _path
+    _run_id = os.environ.setdefault("PTM_TRACE_RUN", uuid.uuid4().hex[:12])
+    if multiprocessing.parent_process() is None and not _summary_registered:
+        _summary_registered = True
+        atexit.register(_print_summary)
+
+def enabled():
+    return _enabled
+
+def _write(record):
+    if _path is None:
+        return
+    record["run"] = _run_id
+    record["pid"] = os.getpid()
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _lock:
+        with open(_path, "a") as f:
+            f.write(line)
+
+def record(name, seconds, **fields):
+    if not _enabled:
+        return
+    with _lock:
+        stat = _stats.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0})
+        stat["count"] += 1
+        stat["total"] += seconds
+        stat["max"] = max(stat["max"], seconds)
+        stat["bytes"] += fields.get("bytes") or 0
+    _write({"ts": time.time(), "span": name, "ms": round(seconds * 1000, 3), **fields})
+
+@contextmanager
+def span(name, **fields):
+    # Felder können im Block ergänzt werden: with span("x") as s: s["bytes"] = n
+    if not _enabled:
+        yield fields
+        return
+    start = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        record(name, time.perf_counter() - start, **fields)
+
+class Laps:
+    # Für Schleifen: Zeit seit dem letzten lap() wird der genannten Phase zugerechnet
+    def __init__(self):
+        self.totals = {}
+        self.mark = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.totals[name] = self.totals.get(name, 0.0) + now - self.mark
+        self.mark = now
+
+    def record(self, prefix, **fields):
+        for name, seconds in self.totals.items():
+            record(f"{prefix}.{name}", seconds, **fields)
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+    _write({"ts": time.time(), "counter": name, "n": n})
+
+def event(name, **fields):
+    if _enabled:
+        _write({"ts": time.time(), "event": name, **fields})
+
+def _collect():
+    # Alle Prozesse dieses Laufs aus der Datei auswerten, ohne Datei nur den eigenen
+    if _path is None or not os.path.exists(_path):
+        return _stats, _counters
+    stats, counters = {}, {}
+    with open(_path) as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("run") != _run_id:
+                continue
+            if "span" in rec:
+                stat = stats.setdefault(rec["span"], {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0})
+                stat["count"] += 1
+                stat["total"] += rec["ms"] / 1000
+                stat["max"] = max(stat["max"], rec["ms"] / 1000)
+                stat["bytes"] += rec.get("bytes") or 0
+            elif "counter" in rec:
+                counters[rec["counter"]] = counters.get(rec["counter"], 0) + rec["n"]
+    return stats, counters
+
+def summary():
+    stats, counters = _collect()
+    lines = [f"{'Phase':<28}{'Anzahl':>8}{'Summe ms':>12}{'Max ms':>10}{'Bytes':>14}"]
+    for name, stat in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+        lines.append(f"{name:<28}{stat['count']:>8}{stat['total'] * 1000:>12.1f}{stat['max'] * 1000:>10.1f}{stat['bytes']:>14}")
+    for name, n in sorted(counters.items()):
+        lines.append(f"{name:<28}{n:>8}")
+    return "\n".join(lines)
+
+def _print_summary():
+    if _stats or _counters or _path:
+        print(summary(), file=sys.stderr)
+    if _temporary and os.path.exists(_path):
+        os.remove(_path)
+
+configure(os.environ.get("PTM_TRACE"))